@@ -1,9 +1,11 @@
 import json
 import os
+import sys
 from datetime import datetime
 
-from src.reports import spending_by_category, write_to_file
-from src.services import get_transactions_list, investment_bank
+from src.reports import iter_spending_by_category, write_reports_by_category, write_to_file
+from src.server import DEFAULT_PORT, run_server
+from src.services import get_investment_table, investment_bank_by_table
 from src.utils import get_data_from_user, get_data_from_xlsx
 from src.views import generate_json_response
 
@@ -51,7 +53,7 @@ def main():
             date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
             base_path = os.path.join(os.path.dirname(__file__), "data")
-            df = get_data_from_xlsx(os.path.join(base_path, "operations.xlsx"))
+            df = get_data_from_xlsx(os.path.join(base_path, "operations.xlsx"), incremental=True)
 
             if user_input == "1":
                 print(generate_json_response(date, df))
@@ -87,26 +89,29 @@ def main():
                         print("Неправильный формат даты. Введите дату в формате YYYY-MM")
                         month = input()
 
-                transactions_list = get_transactions_list(df)
-                investment = investment_bank(month, transactions_list, limit)
+                investment = investment_bank_by_table(month, get_investment_table(df), limit)
                 print(investment)
 
             elif user_input == "3":
                 file_format = input(
-                    "\nВыберите формат для выгрузки отчета (xlsx, csv, json) или нажмите Enter "
+                    "\nВыберите формат для выгрузки отчета (xlsx, csv, json, jsonl) или нажмите Enter "
                     "для выбора формата по умолчанию (json): "
                 ).lower()
 
                 if file_format:
-                    while file_format not in ["csv", "xlsx", "json"]:
-                        print("\nУказан неверный формат. Выберите формат из возможных вариантов: json, csv, excel")
+                    while file_format not in ["csv", "xlsx", "json", "jsonl"]:
+                        print(
+                            "\nУказан неверный формат. Выберите формат из возможных вариантов: json, jsonl, csv, xlsx"
+                        )
                         file_format = input()
                     file_name = f"report.{file_format}"
 
                 else:
                     file_name = None
 
-                category = input("\nВыберите интересующую категорию: ").title()
+                category = input(
+                    "\nВыберите интересующую категорию или нажмите Enter для выгрузки отчетов по всем категориям: "
+                ).title()
                 report_date = input(
                     "\nВведите интересующую месяц в формате DD.MM.YYYY HH:MM:SS или нажмите Enter "
                     "для выбора сегодняшней даты: "
@@ -123,15 +128,30 @@ def main():
                         print("Неправильный формат даты. Введите дату в формате DD.MM.YYYY HH:MM:SS")
                         report_date = input()
 
-                write_to_file(file_name)(spending_by_category)(df, category, report_date)
-                print(
-                    f"Отчет успешно сформирован. Для просмотра перейдите в папку data/ "
-                    f"и откройте report.{file_format if file_format else json}"
-                )
+                if not category:
+                    file_names = write_reports_by_category(df, report_date, file_format or "json")
+                    print(
+                        f"Сформировано отчетов: {len(file_names)}. Для просмотра перейдите в папку data/ "
+                        f"и откройте файлы report_<категория>.{file_format or 'json'}"
+                    )
+
+                else:
+                    write_to_file(file_name)(iter_spending_by_category)(df, category, report_date)
+                    print(
+                        f"Отчет успешно сформирован. Для просмотра перейдите в папку data/ "
+                        f"и откройте report.{file_format if file_format else json}"
+                    )
 
             else:
                 print("Я не знаю такой команды.")
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["serve"]:
+        run_server(
+            os.path.join(os.path.dirname(__file__), "data", "operations.xlsx"),
+            port=int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT,
+            workers=int(sys.argv[3]) if len(sys.argv) > 3 else 1,
+        )
+    else:
+        main()
@@ -0,0 +1,188 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, TypedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "http_client.log")
+
+logger = logging.getLogger("http_client")
+logger.setLevel(logging.INFO)
+# модуль импортируется и процессами пула чтения excel-файлов: лог очищается только в родительском процессе
+file_handler = logging.FileHandler(log_file_path, mode="w" if multiprocessing.parent_process() is None else "a")
+file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(message)s")
+
+file_handler.setFormatter(file_formatter)
+logger.addHandler(file_handler)
+
+
+class EndpointSettings(TypedDict):
+    """Тайм-ауты (на соединение и на чтение) и число повторов запроса к эндпоинту."""
+
+    timeout: tuple[float, float]
+    retries: int
+
+
+ENDPOINTS: dict[str, EndpointSettings] = {
+    "currencies": {"timeout": (3.05, 10), "retries": 2},
+    "stocks": {"timeout": (3.05, 30), "retries": 2},
+}
+DEFAULT_ENDPOINT: EndpointSettings = {"timeout": (3.05, 10), "retries": 1}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_FACTOR = 0.5
+BACKOFF_MAX = 8.0
+
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+stats: dict[str, dict] = {}
+stats_lock = threading.Lock()
+stats_path: str | None = None
+
+MAX_COUNTERS = {"latency_max", "consecutive_failures", "open_until"}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Запрос не отправлен: эндпоинт временно отключен после серии ошибок."""
+
+
+def get_endpoint_stats(endpoint: str) -> dict:
+    """Функция для получения (создания) счетчиков эндпоинта. Вызывается под stats_lock."""
+    return stats.setdefault(
+        endpoint,
+        {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "consecutive_failures": 0,
+            "open_until": 0.0,
+        },
+    )
+
+
+def format_stats(counters_by_endpoint: dict[str, dict]) -> dict[str, dict]:
+    """Функция для вывода счетчиков задержек и ошибок в виде ответа."""
+    return {
+        endpoint: {
+            "requests": counters["requests"],
+            "errors": counters["errors"],
+            "retries": counters["retries"],
+            "short_circuited": counters["short_circuited"],
+            "latency_mean": round(counters["latency_total"] / max(counters["requests"], 1), 4),
+            "latency_max": round(counters["latency_max"], 4),
+            "circuit": "open" if counters["open_until"] > time.monotonic() else "closed",
+        }
+        for endpoint, counters in counters_by_endpoint.items()
+    }
+
+
+def get_stats() -> dict[str, dict]:
+    """Функция для вывода счетчиков задержек и ошибок по всем эндпоинтам."""
+    with stats_lock:
+        return format_stats(stats)
+
+
+def save_stats() -> None:
+    """Функция для записи счетчиков процесса в файл stats_path (если задан) для сводки по нескольким процессам."""
+    if stats_path is None:
+        return
+    with stats_lock:
+        data = json.dumps(stats)
+    temp_path = f"{stats_path}.tmp"
+    with open(temp_path, "w") as stats_file:
+        stats_file.write(data)
+    os.replace(temp_path, stats_path)
+
+
+def get_merged_stats(stats_dir: str) -> dict[str, dict]:
+    """Функция для вывода счетчиков, сложенных по всем процессам, записавшим их в stats_dir."""
+    merged: dict[str, dict] = {}
+    for path in glob.glob(os.path.join(stats_dir, "*.json")):
+        try:
+            with open(path) as stats_file:
+                process_stats = json.load(stats_file)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Skipping stats file {path}: {ex}")
+            continue
+        for endpoint, counters in process_stats.items():
+            total = merged.setdefault(endpoint, dict.fromkeys(counters, 0))
+            for name, value in counters.items():
+                total[name] = max(total[name], value) if name in MAX_COUNTERS else total[name] + value
+    return format_stats(merged)
+
+
+def reset_stats() -> None:
+    """Функция для сброса счетчиков и состояния автоматических выключателей."""
+    with stats_lock:
+        stats.clear()
+
+
+def record_attempt(endpoint: str, latency: float, failed: bool) -> None:
+    """Функция для учета одной попытки запроса и обновления состояния выключателя."""
+    with stats_lock:
+        counters = get_endpoint_stats(endpoint)
+        counters["requests"] += 1
+        counters["latency_total"] += latency
+        counters["latency_max"] = max(counters["latency_max"], latency)
+        if not failed:
+            counters["consecutive_failures"] = 0
+            counters["open_until"] = 0.0
+        else:
+            counters["errors"] += 1
+            counters["consecutive_failures"] += 1
+            if counters["consecutive_failures"] >= BREAKER_THRESHOLD:
+                counters["open_until"] = time.monotonic() + BREAKER_COOLDOWN
+                logger.error(f"Circuit for {endpoint} opened for {BREAKER_COOLDOWN} s after repeated failures.")
+    save_stats()
+
+
+def http_get(url: str, endpoint: str, **kwargs: Any) -> requests.Response:
+    """Функция для GET-запроса через общий пул соединений с тайм-аутом, повторами и выключателем."""
+    settings = ENDPOINTS.get(endpoint, DEFAULT_ENDPOINT)
+    kwargs.setdefault("timeout", settings["timeout"])
+
+    for attempt in range(settings["retries"] + 1):
+        with stats_lock:
+            counters = get_endpoint_stats(endpoint)
+            circuit_open = counters["open_until"] > time.monotonic()
+            if circuit_open:
+                counters["short_circuited"] += 1
+            elif attempt:
+                counters["retries"] += 1
+        if circuit_open:
+            save_stats()
+            logger.warning(f"Circuit for {endpoint} is open. Failing fast.")
+            raise CircuitOpenError(f"Service {endpoint} is temporarily unavailable")
+
+        started_at = time.monotonic()
+        try:
+            response = session.get(url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as ex:
+            record_attempt(endpoint, time.monotonic() - started_at, True)
+            logger.warning(f"Request to {endpoint} failed on attempt {attempt + 1}: {ex}")
+            if attempt == settings["retries"]:
+                raise
+        else:
+            failed = response.status_code in RETRY_STATUSES
+            record_attempt(endpoint, time.monotonic() - started_at, failed)
+            if not failed or attempt == settings["retries"]:
+                return response
+            logger.warning(f"Request to {endpoint} returned {response.status_code} on attempt {attempt + 1}.")
+
+        time.sleep(min(BACKOFF_MAX, BACKOFF_FACTOR * 2**attempt))
+
+    raise requests.exceptions.RetryError(f"No attempts left for {endpoint}")
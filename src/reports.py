@@ -1,13 +1,19 @@
-import io
+import gzip
 import json
 import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Literal, Optional, TextIO, cast
 
+import openpyxl
 import pandas as pd
 
+from src.utils import (DERIVED_COLUMNS, build_totals_index, get_window_totals, is_sorted_by_date, plan_query,
+                       query_operations)
+
 log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "reports.log")
 
 logger = logging.getLogger("reports")
@@ -19,6 +25,103 @@ file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
 
 
+REPORT_CHUNK_SIZE = 10000
+
+
+def serialize_value(value: Any) -> Any:
+    """Функция для сериализации значений, которые не поддерживаются модулем json."""
+    if value is pd.NA:
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def open_report_file(file_name: str, mode: Literal["r", "w"] = "w") -> TextIO:
+    """Функция для открытия файла отчета (со сжатием gzip, если имя оканчивается на .gz)."""
+    if file_name.endswith(".gz"):
+        return cast(TextIO, gzip.open(file_name, f"{mode}t", encoding="utf-8", newline=""))
+    return open(file_name, mode, encoding="utf-8", newline="")
+
+
+def write_json_rows(chunks: Iterable[pd.DataFrame], file_name: str) -> int:
+    """Функция для потоковой записи отчета в JSON-массив (в формате json.dump с indent=4)."""
+    count = 0
+    with open_report_file(file_name) as output_file:
+        output_file.write("[")
+        for chunk in chunks:
+            for row in chunk.to_dict(orient="records"):
+                row_json = json.dumps(row, ensure_ascii=False, indent=4, default=serialize_value)
+                output_file.write(("," if count else "") + "\n    " + row_json.replace("\n", "\n    "))
+                count += 1
+        output_file.write("\n]" if count else "]")
+    return count
+
+
+def write_jsonl_rows(chunks: Iterable[pd.DataFrame], file_name: str) -> int:
+    """Функция для потоковой записи отчета в формате JSON Lines."""
+    count = 0
+    with open_report_file(file_name) as output_file:
+        for chunk in chunks:
+            for row in chunk.to_dict(orient="records"):
+                output_file.write(json.dumps(row, ensure_ascii=False, default=serialize_value) + "\n")
+                count += 1
+    return count
+
+
+def write_csv_rows(chunks: Iterable[pd.DataFrame], file_name: str) -> int:
+    """Функция для потоковой записи отчета в CSV-файл."""
+    count = 0
+    with open_report_file(file_name) as output_file:
+        for number, chunk in enumerate(chunks):
+            chunk.to_csv(output_file, header=number == 0, index=False)
+            count += len(chunk)
+    return count
+
+
+def append_rows_to_sheet(sheet: Any, chunks: Iterable[pd.DataFrame]) -> int:
+    """Функция для добавления строк отчета на лист XLSX-книги (с заголовком из колонок первой части)."""
+    count = 0
+    for number, chunk in enumerate(chunks):
+        if number == 0:
+            sheet.append(list(chunk.columns))
+        for row in chunk.astype(object).itertuples(index=False, name=None):
+            sheet.append([None if pd.isna(value) else value for value in row])
+            count += 1
+    return count
+
+
+def write_xlsx_rows(chunks: Iterable[pd.DataFrame], file_name: str) -> int:
+    """Функция для потоковой записи отчета в XLSX-файл в режиме write-only библиотеки openpyxl."""
+    workbook = openpyxl.Workbook(write_only=True)
+    count = append_rows_to_sheet(workbook.create_sheet(), chunks)
+    workbook.save(file_name)
+    return count
+
+
+def split_by_chunks(df: pd.DataFrame, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Функция для разбиения датафрейма на части по chunk_size строк (пустой датафрейм - одна пустая часть)."""
+    for start in range(0, max(len(df), 1), chunk_size):
+        yield df.iloc[start : start + chunk_size]  # noqa: E203
+
+
+REPORT_WRITERS = {
+    "json": write_json_rows,
+    "jsonl": write_jsonl_rows,
+    "csv": write_csv_rows,
+    "xlsx": write_xlsx_rows,
+}
+
+
+def write_report(chunks: pd.DataFrame | Iterable[pd.DataFrame], file_name: str) -> int:
+    """Функция для потоковой записи отчета, формат определяется расширением файла (.json, .jsonl, .csv, .xlsx, .gz)."""
+    file_format = file_name.removesuffix(".gz").rsplit(".", 1)[-1]
+    writer = REPORT_WRITERS.get(file_format, write_xlsx_rows)
+    if isinstance(chunks, pd.DataFrame):
+        chunks = split_by_chunks(chunks, REPORT_CHUNK_SIZE)
+    count = writer(chunks, file_name)
+    logger.info(f"Written {count} rows to {file_name}")
+    return count
+
+
 def write_to_file(my_file: str = None) -> Any:
     """Декоратор для записи в файл результата, возвращаемого функцией для формирования отчета."""
 
@@ -30,50 +133,207 @@ def write_to_file(my_file: str = None) -> Any:
 
             result = func(*args, **kwargs)
 
-            if not my_file or my_file[-4:] == "json":
-                file_name = os.path.join(file_path, "report.json")
-                with open(file_name, "w", encoding="utf-8") as output_file:
-                    new_result = json.loads(result)
-                    json.dump(new_result, output_file, ensure_ascii=False, indent=4)
+            if result is None:
+                logger.warning("Nothing to write. Report was not generated")
+                return
 
-            elif my_file[-4:] == ".csv":
-                file_name = os.path.join(file_path, my_file)
-                pd.read_json(io.StringIO(result)).to_csv(file_name, index=False)
+            if isinstance(result, str):
+                logger.info("Parsing report serialized to JSON")
+                new_result = json.loads(result)
+                if isinstance(new_result, dict) and not any(isinstance(value, list) for value in new_result.values()):
+                    new_result = [new_result]
+                result = pd.DataFrame(new_result)
 
-            else:
-                file_name = os.path.join(file_path, my_file)
-                pd.read_json(io.StringIO(result)).to_excel(file_name, index=False)
+            write_report(result, os.path.join(file_path, my_file or "report.json"))
 
         return wrapper
 
     return my_decorator
 
 
-def spending_by_category(transactions: pd.DataFrame, category: str, date: Optional[str] = None) -> str:
-    """Функция для формирования отчета."""
-
+def get_report_period(date: Optional[str]) -> Optional[tuple[datetime, datetime]]:
+    """Функция для получения периода отчета: 3 месяца до переданной даты (по умолчанию - текущей)."""
     try:
         logger.info("Getting time diapason")
         end_date = datetime.strptime(date, "%d.%m.%Y %H:%M:%S") if date else datetime.now()
-        start_date = end_date - timedelta(days=90)
+    except ValueError as ex:
+        logger.error(ex)
+        print("Неправильный формат даты. Введите дату в формате DD.MM.YY HH:MM:SS")
+        return None
+    return end_date - timedelta(days=90), end_date
 
-        logger.info(f"Filtering transactions between {start_date} & {end_date}")
-        transactions["date"] = transactions["Дата операции"].map(
-            lambda x: datetime.strptime(str(x), "%d.%m.%Y %H:%M:%S")
-        )
-        filtered_transactions = transactions[(transactions["date"] >= start_date) & (transactions["date"] <= end_date)]
 
-        logger.info("Transforming result into dict")
-        result = (
-            filtered_transactions.loc[transactions["Категория"] == category].iloc[:, :-1].to_dict(orient="records")
-        )
-        try:
-            logger.info("Trying to serialize results")
-            return json.dumps(result, ensure_ascii=False, indent=4)
+def get_report_columns(transactions: pd.DataFrame) -> list[str]:
+    """Функция для получения колонок отчета (без производных колонок, добавленных при загрузке)."""
+    return [column for column in transactions.columns if column not in DERIVED_COLUMNS]
 
-        except Exception as ex:
-            logger.error(ex)
 
-    except ValueError as ex:
+def get_newest_first(transactions: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """Функция для вывода операций отчета от новых к старым, как в выгрузке банка (данные хранятся по возрастанию)."""
+    return rows.iloc[::-1] if is_sorted_by_date(transactions) else rows
+
+
+def iter_spending_by_category(
+    transactions: pd.DataFrame, category: str, date: Optional[str] = None, chunk_size: int = REPORT_CHUNK_SIZE
+) -> Optional[Iterator[pd.DataFrame]]:
+    """Функция для ленивого получения операций по категории за 3 месяца до даты (по chunk_size просмотренных строк)."""
+    period = get_report_period(date)
+    if period is None:
+        return None
+
+    logger.info(f"Searching {category} transactions between {period[0]} & {period[1]}")
+    plan = plan_query(transactions, {}, start_date=period[0], end_date=period[1])
+    # у отсортированных операций период - срез строк, иначе даты проверяются в каждой части вместе с категорией
+    window = get_newest_first(transactions, transactions.iloc[plan["start"] : plan["end"]])  # noqa: E203
+    start_date, end_date = period if plan["scan_dates"] else (None, None)
+    columns = get_report_columns(transactions)
+    return (
+        query_operations(chunk, {"Категория": category}, start_date=start_date, end_date=end_date, columns=columns)
+        for chunk in split_by_chunks(window, chunk_size)
+    )
+
+
+def get_spending_by_category(
+    transactions: pd.DataFrame, category: str, date: Optional[str] = None, index: Optional[dict] = None
+) -> Optional[pd.DataFrame]:
+    """Функция для получения операций по категории за 3 месяца до даты в виде датафрейма (по индексу, если он есть)."""
+    period = get_report_period(date)
+    if period is None:
+        return None
+
+    logger.info(f"Searching {category} transactions between {period[0]} & {period[1]}")
+    result = query_operations(
+        transactions, {"Категория": category}, *period, columns=get_report_columns(transactions), index=index
+    )
+    return get_newest_first(transactions, result)
+
+
+def spending_by_category(
+    transactions: pd.DataFrame, category: str, date: Optional[str] = None, index: Optional[dict] = None
+) -> Optional[str]:
+    """Функция для формирования отчета."""
+
+    filtered_transactions = get_spending_by_category(transactions, category, date, index)
+    if filtered_transactions is None:
+        return None
+
+    logger.info("Transforming result into dict")
+    result = filtered_transactions.to_dict(orient="records")
+    try:
+        logger.info("Trying to serialize results")
+        return json.dumps(result, ensure_ascii=False, indent=4, default=serialize_value)
+
+    except Exception as ex:
         logger.error(ex)
-        print("Неправильный формат даты. Введите дату в формате DD.MM.YY HH:MM:SS")
+
+
+def get_spending_by_categories(
+    transactions: pd.DataFrame, date: Optional[str] = None, categories: Optional[Iterable[str]] = None
+) -> Optional[dict[str, pd.DataFrame]]:
+    """Функция для получения операций за 3 месяца до даты сразу по всем (или выбранным) категориям за один проход."""
+    period = get_report_period(date)
+    if period is None:
+        return None
+
+    logger.info(f"Filtering transactions between {period[0]} & {period[1]}")
+    window = query_operations(
+        transactions,
+        {"Категория": list(categories)} if categories is not None else None,
+        *period,
+        columns=get_report_columns(transactions),
+    )
+    window = get_newest_first(transactions, window)
+
+    logger.info("Grouping transactions by category")
+    return {
+        str(category): group for category, group in window.groupby("Категория", observed=True, sort=True, dropna=True)
+    }
+
+
+def get_spending_totals_by_category(
+    transactions: pd.DataFrame, date: Optional[str] = None, totals: Optional[dict] = None
+) -> Optional[dict[str, dict]]:
+    """Функция для подсчета сумм, кэшбэка и числа операций по каждой категории за 3 месяца до даты."""
+    period = get_report_period(date)
+    if period is None:
+        return None
+
+    if totals is None or totals["rows"] != len(transactions) or "Категория" not in totals["groups"]:
+        totals = build_totals_index(transactions, groups=["Категория"])
+
+    return {
+        str(category): {
+            "amount": round(window_total["Сумма платежа"], 2),
+            "cashback": round(window_total.get("Кэшбэк", 0.0), 2),
+            "count": window_total["count"],
+        }
+        for category, window_total in get_window_totals(totals, "Категория", *period).items()
+    }
+
+
+def spending_totals_by_category(
+    transactions: pd.DataFrame, date: Optional[str] = None, totals: Optional[dict] = None
+) -> Optional[str]:
+    """Функция для формирования отчета с итогами по категориям."""
+    result = get_spending_totals_by_category(transactions, date, totals)
+    if result is None:
+        return None
+    return json.dumps(result, ensure_ascii=False, indent=4)
+
+
+def get_safe_name(name: str, max_length: int = 100) -> str:
+    """Функция для замены символов, недопустимых в именах файлов и листов XLSX."""
+    return re.sub(r'[\\/:*?"<>|\[\]]', "-", name).strip()[:max_length] or "-"
+
+
+def get_unique_names(names: Iterable[str], max_length: int = 100) -> dict[str, str]:
+    """Функция для получения безопасных имен без повторов (повторы нумеруются без учета регистра: "A-B (2)")."""
+    unique_names: dict[str, str] = {}
+    used_names: set[str] = set()
+    for name in names:
+        safe_name = unique_name = get_safe_name(name, max_length)
+        number = 1
+        while unique_name.lower() in used_names:
+            number += 1
+            suffix = f" ({number})"
+            unique_name = safe_name[: max_length - len(suffix)].rstrip() + suffix
+        used_names.add(unique_name.lower())
+        unique_names[name] = unique_name
+    return unique_names
+
+
+def write_reports_by_category(
+    transactions: pd.DataFrame,
+    date: Optional[str] = None,
+    file_format: str = "json",
+    categories: Optional[Iterable[str]] = None,
+    workbook: bool = False,
+    output_dir: Optional[str] = None,
+    max_workers: int = 4,
+) -> list[str]:
+    """Функция для выгрузки отчетов по всем категориям: в отдельные файлы параллельно или в одну XLSX-книгу."""
+    reports = get_spending_by_categories(transactions, date, categories)
+    if reports is None:
+        return []
+
+    output_dir = output_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+    if workbook:
+        file_name = os.path.join(output_dir, "report_by_category.xlsx")
+        book = openpyxl.Workbook(write_only=True)
+        sheet_names = get_unique_names(reports, 31)
+        for category, report in reports.items():
+            append_rows_to_sheet(book.create_sheet(sheet_names[category]), split_by_chunks(report, REPORT_CHUNK_SIZE))
+        if not reports:
+            book.create_sheet()
+        book.save(file_name)
+        logger.info(f"Written {len(reports)} category sheets to {file_name}")
+        return [file_name]
+
+    file_names = {
+        category: os.path.join(output_dir, f"report_{safe_name}.{file_format}")
+        for category, safe_name in get_unique_names(reports).items()
+    }
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda category: write_report(reports[category], file_names[category]), reports))
+    return list(file_names.values())
@@ -0,0 +1,258 @@
+import gc
+import json
+import logging
+import os
+import shutil
+import signal
+import tempfile
+from contextlib import suppress
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Hashable
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from src import http_client
+from src.http_client import get_merged_stats, get_stats
+from src.reports import get_spending_by_category, spending_totals_by_category
+from src.services import (INVESTMENT_LIMITS, build_search_index, get_round_up_columns, investment_bank_by_totals,
+                          search_operations)
+from src.utils import (attach_operations, build_operations_index, build_totals_index, get_data_from_xlsx,
+                       release_operations, share_operations)
+from src.views import generate_json_response
+
+log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "server.log")
+
+logger = logging.getLogger("server")
+logger.setLevel(logging.INFO)
+file_handler = logging.FileHandler(log_file_path, mode="w")
+file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(message)s")
+
+file_handler.setFormatter(file_formatter)
+logger.addHandler(file_handler)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+
+class OperationsServer(ThreadingHTTPServer):
+    """HTTP-сервер, хранящий операции, индексы и накопленные суммы в памяти."""
+
+    df: pd.DataFrame
+    index: dict
+    search_index: dict
+    totals: dict
+    stats_dir: str | None = None
+
+
+def get_records(df: pd.DataFrame) -> list[dict[Hashable, Any]]:
+    """Функция для преобразования операций в список словарей с None вместо пропусков (NaN недопустим в JSON)."""
+    records: list[dict[Hashable, Any]] = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    return records
+
+
+def get_home_page(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа страницы Главная."""
+    date = query.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        response = generate_json_response(date, server.df, server.totals)
+    except json.JSONDecodeError:
+        return 503, json.dumps({"error": "Настройки пользователя не заданы. Запустите приложение через main.py"})
+    if response is None:
+        return 400, json.dumps({"error": "Неправильный формат даты. Введите дату в формате YYYY-MM-DD HH:MM:SS"})
+    return 200, response
+
+
+def get_investment(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа с суммой для «Инвесткопилки» за месяц."""
+    month = query.get("month") or datetime.now().strftime("%Y-%m")
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return 400, json.dumps({"error": "Неправильный формат даты. Введите дату в формате YYYY-MM"})
+
+    limit = query.get("limit", "50")
+    if not limit.isdigit() or int(limit) not in INVESTMENT_LIMITS:
+        return 400, json.dumps({"error": "Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100"})
+
+    response = investment_bank_by_totals(month, server.totals, int(limit))
+    if response is None:
+        return 200, json.dumps({"month": month, "investment_amount": 0.0})
+    return 200, response
+
+
+def get_category_report(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа с отчетом по тратам определенной категории."""
+    if not query.get("category"):
+        return 400, json.dumps({"error": "Укажите категорию"})
+    transactions = get_spending_by_category(server.df, query["category"], query.get("date"), server.index)
+    if transactions is None:
+        return 400, json.dumps({"error": "Неправильный формат даты. Введите дату в формате DD.MM.YYYY HH:MM:SS"})
+    return 200, json.dumps(get_records(transactions), ensure_ascii=False, allow_nan=False)
+
+
+def get_category_totals(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа с итогами по всем категориям за 3 месяца до даты."""
+    response = spending_totals_by_category(server.df, query.get("date"), server.totals)
+    if response is None:
+        return 400, json.dumps({"error": "Неправильный формат даты. Введите дату в формате DD.MM.YYYY HH:MM:SS"})
+    return 200, response
+
+
+def get_search_results(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа с операциями, найденными по словам описания."""
+    if not query.get("q"):
+        return 400, json.dumps({"error": "Укажите поисковый запрос"})
+    try:
+        start_date = datetime.fromisoformat(query["start"]) if query.get("start") else None
+        end_date = datetime.fromisoformat(query["end"]) if query.get("end") else None
+    except ValueError:
+        return 400, json.dumps({"error": "Неправильный формат даты. Введите дату в формате YYYY-MM-DD HH:MM:SS"})
+    limit = query.get("limit", "20")
+    if not limit.isdigit():
+        return 400, json.dumps({"error": "Неправильное количество результатов"})
+
+    result = search_operations(
+        server.df, server.search_index, query["q"], query.get("card"), start_date, end_date, int(limit)
+    )
+    return 200, json.dumps(result, ensure_ascii=False)
+
+
+def get_http_stats(server: OperationsServer, query: dict[str, str]) -> tuple[int, str]:
+    """Функция для ответа со счетчиками запросов к внешним API (сводными по всем процессам сервера)."""
+    if server.stats_dir is not None:
+        return 200, json.dumps(get_merged_stats(server.stats_dir))
+    return 200, json.dumps(get_stats())
+
+
+ROUTES = {
+    "/home": get_home_page,
+    "/investment": get_investment,
+    "/reports/category": get_category_report,
+    "/reports/totals": get_category_totals,
+    "/search": get_search_results,
+    "/stats": get_http_stats,
+}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к JSON-эндпоинтам приложения."""
+
+    server: OperationsServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path.rstrip("/") or "/")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if route is None:
+            status, body = 404, json.dumps({"error": f"Unknown endpoint {url.path}"})
+        else:
+            try:
+                status, body = route(self.server, query)
+            except Exception as ex:
+                logger.error(f"Request {self.path} failed: {ex}")
+                status, body = 500, json.dumps({"error": "Internal server error"})
+
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def set_server_data(server: OperationsServer, df: pd.DataFrame) -> OperationsServer:
+    """Функция для передачи серверу операций и построения индексов и накопленных сумм."""
+    server.df = df
+    server.index = build_operations_index(df)
+    server.search_index = build_search_index(df)
+    server.totals = build_totals_index(df, get_round_up_columns(df), index=server.index)
+    return server
+
+
+def create_server(df: pd.DataFrame, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> OperationsServer:
+    """Функция для создания сервера, хранящего операции и индексы в памяти."""
+    server = OperationsServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    return set_server_data(server, df)
+
+
+def stop_server(signum: int, frame: Any) -> None:
+    """Функция-обработчик SIGTERM: останавливает сервер так же, как Ctrl+C (с освобождением общих ресурсов)."""
+    raise KeyboardInterrupt
+
+
+def run_worker(server: OperationsServer) -> None:
+    """Функция для запуска процесса-обработчика над общими данными, подготовленными родительским процессом."""
+    http_client.stats_path = os.path.join(str(server.stats_dir), f"{os.getpid()}.json")
+    logger.info(f"Worker {os.getpid()} started")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os._exit(0)
+
+
+def run_server(file_path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 1) -> None:
+    """Функция для запуска сервера (при workers > 1 - нескольких процессов над данными в разделяемой памяти)."""
+    logger.info(f"Loading operations from {file_path}")
+    df = get_data_from_xlsx(file_path, incremental=True)
+    if df is None:
+        print("Не удалось загрузить операции")
+        return
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        server = create_server(df, host, port)
+        print(f"Сервер запущен: http://{host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    segments, spec = share_operations(df)
+    del df
+    shared_df, shared_segments = attach_operations(spec)
+    # индексы и накопленные суммы строятся один раз до fork, процессы получают их копированием при записи,
+    # а gc.freeze не дает сборщику мусора трогать (и тем самым копировать) унаследованные страницы памяти
+    server = set_server_data(OperationsServer((host, port), RequestHandler), shared_df)
+    server.daemon_threads = True
+    server.stats_dir = tempfile.mkdtemp(prefix="skybank-stats-")
+    del shared_df
+    gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(server)
+        children.append(pid)
+
+    signal.signal(signal.SIGTERM, stop_server)
+    print(f"Сервер запущен: http://{host}:{server.server_port} ({workers} процессов)")
+    logger.info(f"Started workers {children}")
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        # повторный сигнал не должен прервать освобождение разделяемой памяти
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for pid in children:
+            with suppress(ProcessLookupError, ChildProcessError):
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+    finally:
+        server.server_close()
+        del server.df, server.index, server.search_index, server.totals
+        release_operations(shared_segments)
+        release_operations(segments, unlink=True)
+        shutil.rmtree(server.stats_dir, ignore_errors=True)
@@ -1,11 +1,17 @@
 import json
 import logging
 import os
+import re
+from bisect import bisect_left
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterable
 
+import numpy as np
 import pandas as pd
 
+from src.utils import (build_operations_index, get_card_numbers, get_operation_dates, get_window_total,
+                       query_operations, update_operations_index)
+
 log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "services.log")
 
 logger = logging.getLogger("services")
@@ -16,25 +22,40 @@ file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(me
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
 
+INVESTMENT_LIMITS = [10, 50, 100]
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SEARCH_COLUMNS = ["Описание", "card"]
+RESULT_COLUMNS = ["Дата операции", "Сумма операции", "Номер карты", "Категория", "Описание", "card", "date"]
+
 
 def get_transactions_list(df: pd.DataFrame) -> list[dict[str, Any]]:
     """Функция для формирования списка транзакций."""
-    logger.info("Transforming df to dict")
-    transactions = df.to_dict(orient="records")
+    logger.info("Getting operation dates")
+    dates = get_operation_dates(df)
+    valid_dates = dates.notna()
+    if not valid_dates.all():
+        logger.warning(f"Skipping {(~valid_dates).sum()} transactions without valid operation date")
+
     logger.info("Trying to convert data to the format needed")
+    return [
+        {"Дата операции": date, "Сумма операции": amount}
+        for date, amount in zip(
+            dates[valid_dates].dt.strftime("%Y-%m-%d").tolist(), df.loc[valid_dates, "Сумма операции"].tolist()
+        )
+    ]
+
+
+def get_operations_by_month(month: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Функция для получения операций за месяц из датафрейма."""
     try:
-        return [
-            {
-                "Дата операции": datetime.strftime(
-                    datetime.strptime(transaction.get("Дата операции"), "%d.%m.%Y %H:%M:%S"), "%Y-%m-%d"
-                ),
-                "Сумма операции": transaction.get("Сумма операции"),
-            }
-            for transaction in transactions
-        ]
-    except Exception as ex:
+        logger.info("Checking if input data is correct")
+        period = pd.Period(datetime.strptime(month, "%Y-%m"), freq="M")
+    except ValueError as ex:
         logger.error(ex)
-        return []
+        print("Неправильный формат даты. Введите дату в формате YYYY-MM")
+        return df.iloc[:0]
+    return query_operations(df, start_date=period.start_time, end_date=period.end_time)
 
 
 def filter_by_month(month: str, transactions_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
@@ -69,3 +90,214 @@ def investment_bank(month: str, transactions: list[dict[str, Any]], limit: int)
         amounts = [transaction.get("Сумма операции") for transaction in filtered_transactions]
         result = {"month": month, "investment_amount": sum(round_to_limit(amount, limit) for amount in amounts)}
         return json.dumps(result)
+
+
+def investment_bank_by_chunks(month: str, chunks: Iterable[pd.DataFrame], limit: int) -> str | None:
+    """Функция для подсчета суммы, которую удалось бы отложить в «Инвесткопилку», при потоковом чтении данных."""
+    try:
+        logger.info("Checking if input data is correct")
+        datetime.strptime(month, "%Y-%m")
+    except ValueError as ex:
+        logger.error(ex)
+        print("Неправильный формат даты. Введите дату в формате YYYY-MM")
+        return None
+
+    investment_amount = 0.0
+    transactions_found = False
+    for chunk in chunks:
+        filtered_transactions = filter_by_month(month, get_transactions_list(chunk))
+        transactions_found = transactions_found or bool(filtered_transactions)
+        investment_amount += sum(
+            round_to_limit(transaction.get("Сумма операции"), limit) for transaction in filtered_transactions
+        )
+
+    if transactions_found:
+        logger.info("Successful operation. Returning result")
+        return json.dumps({"month": month, "investment_amount": investment_amount})
+    return None
+
+
+def get_round_ups(amounts: np.ndarray, limits: list[int]) -> np.ndarray:
+    """Функция для векторного округления сумм до каждого из лимитов (строки - суммы, колонки - лимиты)."""
+    limits_array = np.array(limits, dtype=float)
+    remainders = np.round(np.abs(np.asarray(amounts, dtype=float))[:, np.newaxis] % limits_array, 2)
+    round_ups = np.where(remainders != 0, limits_array - remainders, 0.0)
+    return np.nan_to_num(round_ups, nan=0.0)
+
+
+def get_investment_table(df: pd.DataFrame, limits: list[int] = INVESTMENT_LIMITS) -> pd.DataFrame:
+    """Функция для подсчета сумм для «Инвесткопилки» сразу по всем месяцам и лимитам (строки - месяцы YYYY-MM)."""
+    logger.info("Getting operation months")
+    dates = get_operation_dates(df)
+    valid_dates = dates.notna().to_numpy()
+    months = dates[valid_dates].dt.to_period("M").astype(str).to_numpy()
+
+    logger.info(f"Calculating round ups for limits {limits}")
+    round_ups = get_round_ups(df["Сумма операции"].to_numpy(dtype=float)[valid_dates], limits)
+    return pd.DataFrame(round_ups, columns=limits).groupby(months).sum().round(2)
+
+
+def investment_bank_by_table(month: str, table: pd.DataFrame, limit: int) -> str | None:
+    """Функция, отдающая JSON-ответ с суммой для «Инвесткопилки» по заранее посчитанной таблице месяц × лимит."""
+    try:
+        logger.info("Checking if input data is correct")
+        datetime.strptime(month, "%Y-%m")
+    except ValueError as ex:
+        logger.error(ex)
+        print("Неправильный формат даты. Введите дату в формате YYYY-MM")
+        return None
+
+    if month not in table.index:
+        logger.info(f"No transactions found for {month}")
+        return None
+
+    if limit not in table.columns:
+        logger.warning(f"Incorrect limit: {limit}")
+        print("Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100")
+        return json.dumps({"month": month, "investment_amount": 0.0})
+
+    logger.info("Successful operation. Returning result")
+    return json.dumps({"month": month, "investment_amount": float(table.at[month, limit])})
+
+
+def get_round_up_columns(df: pd.DataFrame, limits: list[int] = INVESTMENT_LIMITS) -> dict[str, np.ndarray]:
+    """Функция для получения сумм округления каждой операции по каждому лимиту (для накопленных сумм)."""
+    round_ups = get_round_ups(df["Сумма операции"].to_numpy(dtype=float, na_value=np.nan), limits)
+    return {f"round_up_{limit}": round_ups[:, number] for number, limit in enumerate(limits)}
+
+
+def investment_bank_by_totals(month: str, totals: dict, limit: int) -> str | None:
+    """Функция, отдающая JSON-ответ с суммой для «Инвесткопилки» по накопленным суммам округлений."""
+    try:
+        logger.info("Checking if input data is correct")
+        period = pd.Period(datetime.strptime(month, "%Y-%m"), freq="M")
+    except ValueError as ex:
+        logger.error(ex)
+        print("Неправильный формат даты. Введите дату в формате YYYY-MM")
+        return None
+
+    window_total = get_window_total(totals["all"], period.start_time, period.end_time)
+    if not window_total["count"]:
+        logger.info(f"No transactions found for {month}")
+        return None
+
+    if f"round_up_{limit}" not in window_total:
+        logger.warning(f"Incorrect limit: {limit}")
+        print("Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100")
+        return json.dumps({"month": month, "investment_amount": 0.0})
+
+    logger.info("Successful operation. Returning result")
+    return json.dumps({"month": month, "investment_amount": round(window_total[f"round_up_{limit}"], 2)})
+
+
+def tokenize(text: Any) -> list[str]:
+    """Функция для разбиения текста на слова без учета регистра (буква «ё» приравнивается к «е»)."""
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.casefold().replace("ё", "е"))
+
+
+def add_descriptions_to_search_index(search_index: dict, descriptions: Iterable[str]) -> None:
+    """Функция для добавления в словарь поискового индекса слов из новых описаний операций."""
+    token_map = search_index["token_map"]
+    for description in descriptions:
+        if description in search_index["descriptions"]:
+            continue
+        search_index["descriptions"].add(description)
+        for token in set(tokenize(description)):
+            token_map.setdefault(token, []).append(description)
+    search_index["tokens"] = sorted(token_map)
+
+
+def build_search_index(df: pd.DataFrame) -> dict:
+    """Функция для построения поискового индекса по словам колонки «Описание»."""
+    logger.info("Building search index for descriptions")
+    search_index: dict[str, Any] = {
+        "token_map": {},
+        "tokens": [],
+        "descriptions": set(),
+        "operations": build_operations_index(df, SEARCH_COLUMNS),
+    }
+    add_descriptions_to_search_index(search_index, df["Описание"].dropna().unique())
+    logger.info(f"Search index built for {len(search_index['tokens'])} tokens")
+    return search_index
+
+
+def update_search_index(search_index: dict, df: pd.DataFrame) -> dict:
+    """Функция для дополнения поискового индекса строками, добавленными в конец датафрейма."""
+    new_descriptions = df["Описание"].iloc[search_index["operations"]["rows"] :].dropna().unique()  # noqa: E203
+    add_descriptions_to_search_index(search_index, new_descriptions)
+    search_index["operations"] = update_operations_index(search_index["operations"], df)
+    return search_index
+
+
+def get_description_scores(search_index: dict, query: str) -> dict[str, float]:
+    """Функция для подсчета релевантности описаний: каждое слово запроса - префикс (точное совпадение весит больше)."""
+    tokens = search_index["tokens"]
+    scores: dict[str, float] | None = None
+    for term in tokenize(query):
+        term_scores: dict[str, float] = {}
+        for position in range(bisect_left(tokens, term), bisect_left(tokens, term + "\U0010ffff")):
+            weight = 2.0 if tokens[position] == term else 1.0
+            for description in search_index["token_map"][tokens[position]]:
+                term_scores[description] = max(term_scores.get(description, 0.0), weight)
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {
+                description: score + term_scores[description]
+                for description, score in scores.items()
+                if description in term_scores
+            }
+        if not scores:
+            break
+    return scores or {}
+
+
+def search_operations(
+    df: pd.DataFrame,
+    search_index: dict,
+    query: str,
+    card: str | list[str] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int = 20,
+) -> list[dict[str, Any]]:
+    """Функция для поиска операций по словам описания с фильтрами по карте и периоду (сначала самые релевантные)."""
+    logger.info(f"Searching operations by query {query!r}")
+    scores = get_description_scores(search_index, query)
+    if not scores:
+        logger.info("Nothing found")
+        return []
+
+    filters = {"Описание": list(scores)}
+    if card is not None:
+        filters["card"] = [card] if isinstance(card, str) else list(card)
+    found = query_operations(
+        df, filters, start_date, end_date, columns=RESULT_COLUMNS, index=search_index["operations"]
+    )
+
+    logger.info(f"Ranking {len(found)} found operations")
+    ranks = pd.DataFrame(
+        {
+            "score": found["Описание"].astype(object).map(scores).to_numpy(dtype=float),
+            "date": get_operation_dates(found).to_numpy(),
+        }
+    ).sort_values(["score", "date"], ascending=False, kind="stable")
+    best = found.iloc[ranks.index[:limit]]
+    results = pd.DataFrame(
+        {
+            "date": best["Дата операции"],
+            "amount": best["Сумма операции"],
+            "card": get_card_numbers(best),
+            "category": best["Категория"],
+            "description": best["Описание"],
+        }
+    ).astype(object)
+    results = results.where(results.notna(), None)
+    return [
+        {"date": date, "amount": amount, "card": card, "category": category, "description": text, "score": score}
+        for (date, amount, card, category, text), score in zip(
+            results.itertuples(index=False, name=None), ranks["score"].iloc[:limit].tolist()
+        )
+    ]
@@ -1,52 +1,807 @@
+import glob
+import hashlib
+import heapq
 import json
 import logging
+import multiprocessing
 import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import chain
+from multiprocessing.shared_memory import SharedMemory
+from operator import itemgetter
+from typing import Any, Generator, Iterable, Iterator, TypedDict
 
 import numpy as np
+import openpyxl
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from src.http_client import http_get
+
 log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "utils.log")
 
 logger = logging.getLogger("utils")
 logger.setLevel(logging.INFO)
-file_handler = logging.FileHandler(log_file_path, mode="w")
+# процессы пула, запущенные через spawn, заново импортируют модуль и не должны очищать лог родителя
+file_handler = logging.FileHandler(log_file_path, mode="w" if multiprocessing.parent_process() is None else "a")
 file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(message)s")
 
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
 
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", ".cache")
+CACHE_VERSION = 2
+
+CURRENCIES_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+CURRENCIES_CACHE_FILE = "currencies_rates.json"
+CURRENCIES_CACHE_TTL = 60 * 60
+CURRENCIES_CACHE_DAYS = 30
+
+STOCKS_URL = "https://financialmodelingprep.com/api/v3/stock/list"
+STOCKS_CACHE_FILE = "stocks_index.json"
+STOCKS_CACHE_TTL = 15 * 60
+
+
+@dataclass
+class StocksIndex:
+    """Индекс цен акций по тикеру, время его загрузки и поток фонового обновления."""
+
+    prices: dict[str, float] | None = None
+    fetched_at: float = 0.0
+    refresh: threading.Thread | None = None
+
+
+stocks_index = StocksIndex()
+
+
+class QueryPlan(TypedDict):
+    """План выборки: границы строк по датам, ведущий фильтр по индексу и фильтры, проверяемые по строкам."""
+
+    start: int
+    end: int
+    driver: str | None
+    scanned: list[str]
+    scan_dates: bool
+
+
+stocks_index_lock = threading.Lock()
+
+data_fingerprints: dict[int, tuple[weakref.ref, tuple[int, int], str]] = {}
+
+TRANSACTION_COLUMNS = [
+    "Дата операции",
+    "Дата платежа",
+    "Номер карты",
+    "Статус",
+    "Сумма операции",
+    "Валюта операции",
+    "Сумма платежа",
+    "Валюта платежа",
+    "Кэшбэк",
+    "Категория",
+    "MCC",
+    "Описание",
+    "Бонусы (включая кэшбэк)",
+    "Округление на инвесткопилку",
+    "Сумма операции с округлением",
+]
+
+CARD_AGGREGATES = ["count", "min", "max", "mean"]
+
+CATEGORICAL_COLUMNS = [
+    "Дата платежа",
+    "Номер карты",
+    "Статус",
+    "Валюта операции",
+    "Валюта платежа",
+    "Категория",
+    "Описание",
+    "source",
+]
+
+DERIVED_COLUMNS = ["card", "date", "payment_date"]
+
+INDEXED_COLUMNS = ["Категория", "MCC", "card"]
+
+TOTALS_COLUMNS = ["Сумма платежа", "Кэшбэк"]
+TOTALS_GROUPS = ["card", "Категория"]
+
+NUMERIC_COLUMNS = [
+    "Сумма операции",
+    "Сумма платежа",
+    "Кэшбэк",
+    "MCC",
+    "Бонусы (включая кэшбэк)",
+    "Округление на инвесткопилку",
+    "Сумма операции с округлением",
+]
+
+
+def get_empty_df() -> pd.DataFrame:
+    """Функция для получения датафрейма-заглушки с одной пустой операцией."""
+    return pd.DataFrame({column: [np.nan] for column in TRANSACTION_COLUMNS})
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Функция для приведения колонок датафрейма с операциями к компактным типам данных."""
+    memory_before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("category")
+
+    for column in NUMERIC_COLUMNS:
+        if column in df:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int64" if column == "MCC" else float)
+
+    if "Номер карты" in df:
+        df["card"] = get_card_numbers(df).astype("category")
+
+    if "Дата операции" in df:
+        df["date"] = parse_dates(df["Дата операции"], "%d.%m.%Y %H:%M:%S")
+
+    if "Дата платежа" in df:
+        df["payment_date"] = parse_dates(df["Дата платежа"], "%d.%m.%Y")
+
+    memory_after = df.memory_usage(deep=True).sum()
+    logger.info(f"Memory usage changed from {memory_before / 1024:.1f} KB to {memory_after / 1024:.1f} KB")
+    return df
+
+
+def get_card_numbers(df: pd.DataFrame) -> pd.Series:
+    """Функция для получения номеров карт без символа '*' (используется уже подготовленная колонка card)."""
+    if "card" in df:
+        return df["card"]
+    cards = df["Номер карты"].astype(object)
+    return cards.where(cards.isna(), cards.astype(str).str.replace("*", "", regex=False)).rename("card")
+
+
+def parse_dates(dates: pd.Series, date_format: str) -> pd.Series:
+    """Функция для векторного преобразования колонки с датами в datetime64 (некорректные даты становятся NaT)."""
+    parsed_dates = pd.to_datetime(dates.astype(object), format=date_format, errors="coerce")
+    malformed = parsed_dates.isna() & dates.notna()
+    if malformed.any():
+        logger.warning(
+            f"Found {malformed.sum()} malformed dates in column {dates.name}. "
+            f"First of them: {dict(dates[malformed].head())}"
+        )
+    return parsed_dates
+
+
+def get_operation_dates(df: pd.DataFrame) -> pd.Series:
+    """Функция для получения дат операций в формате datetime64 (используется уже разобранная колонка date)."""
+    if "date" in df and pd.api.types.is_datetime64_any_dtype(df["date"]):
+        return df["date"]
+    logger.info("Parsing operation dates")
+    return parse_dates(df["Дата операции"], "%d.%m.%Y %H:%M:%S").rename("date")
+
+
+def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """Функция для сортировки операций по возрастанию даты операции (операции без даты - в конце)."""
+    logger.info("Sorting operations by date")
+    dates = get_operation_dates(df)
+    df = df.iloc[np.argsort(dates.to_numpy(), kind="stable")].reset_index(drop=True)
+    df.attrs["sorted_by_date"] = True
+    return df
+
+
+def is_sorted_by_date(df: pd.DataFrame) -> bool:
+    """Функция для проверки флага sorted_by_date: он копируется pandas в переупорядоченные датафреймы."""
+    if not df.attrs.get("sorted_by_date"):
+        return False
+
+    dates = get_operation_dates(df).to_numpy()
+    # результат проверки привязан к датафрейму и массиву дат: копия флага в другом датафрейме проверяется заново
+    key = (id(df), dates.__array_interface__["data"][0], len(dates))
+    if df.attrs.get("sorted_by_date_checked") == key:
+        return True
+
+    valid = np.count_nonzero(~np.isnat(dates))
+    if np.isnat(dates[:valid]).any() or (dates[1:valid] < dates[: valid - 1]).any():  # noqa: E203
+        logger.warning("Operations are marked as sorted by date, but they are not. Ignoring the flag")
+        df.attrs["sorted_by_date"] = False
+        return False
+    df.attrs["sorted_by_date_checked"] = key
+    return True
+
+
+def get_operations_by_period(df: pd.DataFrame, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """Функция для получения операций с start_date по end_date включительно."""
+    logger.info(f"Getting operations from {start_date} to {end_date}")
+    return query_operations(df, start_date=start_date, end_date=end_date)
+
+
+def concat_operations(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Функция для объединения датафреймов с операциями с сохранением категориальных типов колонок."""
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    for column in frames[0].columns:
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames if column in frame):
+            categories = pd.Index(
+                np.concatenate([frame[column].cat.categories.to_numpy(dtype=object) for frame in frames])
+            ).unique()
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_positions_by_value(values: pd.Series, offset: int = 0) -> dict[Any, np.ndarray]:
+    """Функция для получения возрастающих номеров строк для каждого значения колонки (пропуски не учитываются)."""
+    return {
+        value: positions + offset
+        for value, positions in values.groupby(values.to_numpy(), sort=False, dropna=True).indices.items()
+    }
+
+
+def build_operations_index(df: pd.DataFrame, columns: Iterable[str] = INDEXED_COLUMNS) -> dict:
+    """Функция для построения инвертированного индекса: значение колонки -> отсортированные номера строк."""
+    logger.info(f"Building index for columns {list(columns)}")
+    return {
+        "rows": len(df),
+        "columns": {
+            column: get_positions_by_value(get_card_numbers(df) if column == "card" else df[column])
+            for column in columns
+            if column in df or column == "card" and "Номер карты" in df
+        },
+    }
+
+
+def update_operations_index(index: dict, df: pd.DataFrame) -> dict:
+    """Функция для дополнения индекса строками, добавленными в конец датафрейма после его построения."""
+    new_rows = df.iloc[index["rows"] :]  # noqa: E203
+    logger.info(f"Updating index with {len(new_rows)} appended rows")
+    columns = {}
+    for column, positions_by_value in index["columns"].items():
+        values = get_card_numbers(new_rows) if column == "card" else new_rows[column]
+        columns[column] = dict(positions_by_value)
+        for value, positions in get_positions_by_value(values, index["rows"]).items():
+            if value in columns[column]:
+                columns[column][value] = np.concatenate([columns[column][value], positions])
+            else:
+                columns[column][value] = positions
+    return {"rows": len(df), "columns": columns}
+
+
+def append_operations(
+    df: pd.DataFrame, new_rows: pd.DataFrame, index: dict | None = None
+) -> tuple[pd.DataFrame, dict | None]:
+    """Функция для добавления операций к отсортированным данным (без пересортировки, если новые операции не раньше)."""
+    new_rows = sort_by_date(new_rows)
+    dates, new_dates = get_operation_dates(df), get_operation_dates(new_rows)
+    in_order = (
+        df.empty
+        or new_rows.empty
+        or is_sorted_by_date(df)
+        and pd.notna(dates.iloc[-1])
+        and (pd.isna(new_dates.iloc[0]) or new_dates.iloc[0] >= dates.iloc[-1])
+    )
+    combined = concat_operations([df, new_rows])
+
+    if in_order:
+        combined.attrs["sorted_by_date"] = True
+        return combined, update_operations_index(index, combined) if index is not None else None
+
+    logger.info("Appended operations are older than loaded ones. Re-sorting all operations")
+    combined = sort_by_date(combined)
+    return combined, build_operations_index(combined, index["columns"]) if index is not None else None
+
+
+def get_column_values(df: pd.DataFrame, column: str, rows: slice | np.ndarray = slice(None)) -> pd.Series:
+    """Функция для получения значений колонки только в нужных строках (card и date строятся при отсутствии)."""
+    if column == "card" and "card" not in df:
+        return get_card_numbers(df[["Номер карты"]].iloc[rows])
+    if column == "date" and ("date" not in df or not pd.api.types.is_datetime64_any_dtype(df["date"])):
+        return parse_dates(df["Дата операции"].iloc[rows], "%d.%m.%Y %H:%M:%S").rename("date")
+    return df[column].iloc[rows]
+
+
+def plan_query(
+    df: pd.DataFrame,
+    filters: dict[str, list],
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    index: dict | None = None,
+) -> QueryPlan:
+    """Функция для выбора плана выборки: границы дат, ведущий фильтр по индексу и проверяемые по строкам фильтры."""
+    plan: QueryPlan = {"start": 0, "end": len(df), "driver": None, "scanned": list(filters), "scan_dates": False}
+
+    if (start_date is not None or end_date is not None) and is_sorted_by_date(df):
+        dates = get_column_values(df, "date")
+        if start_date is not None:
+            plan["start"] = int(dates.searchsorted(pd.Timestamp(start_date), side="left"))
+        if end_date is not None:
+            plan["end"] = int(dates.searchsorted(pd.Timestamp(end_date), side="right"))
+    elif start_date is not None or end_date is not None:
+        plan["scan_dates"] = True
+
+    if index is not None:
+        sizes = {
+            column: sum(len(index["columns"][column].get(value, ())) for value in values)
+            for column, values in filters.items()
+            if column in index["columns"]
+        }
+        # по индексу выбирается только самый избирательный фильтр, остальные проверяются на отобранных строках
+        if sizes and min(sizes.values()) < plan["end"] - plan["start"]:
+            driver = min(sizes, key=sizes.__getitem__)
+            plan["driver"] = driver
+            plan["scanned"].remove(driver)
+    return plan
+
+
+def query_operations(
+    df: pd.DataFrame,
+    filters: dict[str, Any] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    amount_range: tuple[float | None, float | None] | None = None,
+    columns: list[str] | None = None,
+    index: dict | None = None,
+    amount_column: str = "Сумма операции",
+) -> pd.DataFrame:
+    """Функция для выборки операций по фильтрам (значение или список значений колонки), датам и диапазону сумм."""
+    filters = {
+        column: list(values) if isinstance(values, (list, tuple, set)) else [values]
+        for column, values in (filters or {}).items()
+    }
+    missing = [column for column in filters if column not in df and not (column == "card" and "Номер карты" in df)]
+    if missing:
+        logger.warning(f"Columns {missing} are not found. No operations match the query")
+        return df.iloc[:0]
+
+    if index is not None and index["rows"] != len(df):
+        logger.warning("Index is out of date. Rebuilding it")
+        index = build_operations_index(df, index["columns"])
+
+    plan = plan_query(df, filters, start_date, end_date, index)
+    logger.info(f"Query plan: rows {plan['start']}-{plan['end']}, index on {plan['driver']}, scan {plan['scanned']}")
+
+    rows: slice | np.ndarray = slice(plan["start"], plan["end"])
+    if plan["driver"] is not None and index is not None:
+        positions_by_value = index["columns"][plan["driver"]]
+        matched = [positions_by_value[value] for value in filters[plan["driver"]] if value in positions_by_value]
+        positions = (
+            np.unique(np.concatenate(matched)) if len(matched) > 1 else matched[0] if matched else np.empty(0, np.intp)
+        )
+        start, end = np.searchsorted(positions, plan["start"]), np.searchsorted(positions, plan["end"])
+        rows = positions[start:end]
+
+    masks = [
+        get_column_values(df, column, rows).isin(filters[column]).to_numpy(dtype=bool, na_value=False)
+        for column in plan["scanned"]
+    ]
+    if plan["scan_dates"]:
+        dates = get_column_values(df, "date", rows).to_numpy()
+        if start_date is not None:
+            masks.append(dates >= np.datetime64(pd.Timestamp(start_date)))
+        if end_date is not None:
+            masks.append(dates <= np.datetime64(pd.Timestamp(end_date)))
+    if amount_range is not None:
+        amounts = df[amount_column].iloc[rows].to_numpy(dtype=float, na_value=np.nan)
+        if amount_range[0] is not None:
+            masks.append(amounts >= amount_range[0])
+        if amount_range[1] is not None:
+            masks.append(amounts <= amount_range[1])
+
+    if masks:
+        rows = (np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows)[np.logical_and.reduce(masks)]
+    if columns is None:
+        return df.iloc[rows]
+    return df.iloc[rows, df.columns.get_indexer([column for column in columns if column in df])]
+
+
+def aggregate_operations(
+    df: pd.DataFrame, by: str, column: str = "Сумма платежа", aggregates: Iterable[str] = ("sum",)
+) -> pd.DataFrame:
+    """Функция для агрегации колонки по значениям другой колонки (строки с пропуском в by не учитываются)."""
+    logger.info(f"Aggregating {column} by {by}")
+    return df[column].groupby(get_column_values(df, by), observed=True, sort=True).agg(list(aggregates))
+
+
+def get_indexed_operations(
+    df: pd.DataFrame,
+    index: dict,
+    filters: dict[str, Any],
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+) -> pd.DataFrame:
+    """Функция для выборки операций по индексу (фильтр - значение или список значений колонки) и границам дат."""
+    return query_operations(df, filters, start_date, end_date, index=index)
+
+
+def get_prefix_sums(dates: np.ndarray, values: dict[str, np.ndarray], positions: np.ndarray) -> dict:
+    """Функция для построения накопленных сумм по строкам positions, упорядоченным по дате (без строк без даты)."""
+    positions = positions[~np.isnat(dates[positions])]
+    order = positions[np.argsort(dates[positions], kind="stable")]
+    return {
+        "dates": dates[order],
+        "sums": {
+            name: np.concatenate([[0.0], np.cumsum(np.nan_to_num(column[order]))]) for name, column in values.items()
+        },
+    }
+
+
+def build_totals_index(
+    df: pd.DataFrame,
+    values: dict[str, np.ndarray] | None = None,
+    groups: Iterable[str] = TOTALS_GROUPS,
+    index: dict | None = None,
+) -> dict:
+    """Функция для построения накопленных сумм по всем операциям и отдельно по каждому значению колонок groups."""
+    groups = list(groups)
+    logger.info(f"Building prefix sums by {groups}")
+    dates = get_column_values(df, "date").to_numpy(dtype="datetime64[ns]")
+    values = {
+        **{column: df[column].to_numpy(dtype=float, na_value=np.nan) for column in TOTALS_COLUMNS if column in df},
+        **(values or {}),
+    }
+    if index is None or index["rows"] != len(df) or any(column not in index["columns"] for column in groups):
+        index = build_operations_index(df, groups)
+
+    return {
+        "rows": len(df),
+        "all": get_prefix_sums(dates, values, np.arange(len(df))),
+        "groups": {
+            column: {
+                value: get_prefix_sums(dates, values, positions)
+                for value, positions in sorted(index["columns"].get(column, {}).items(), key=lambda item: str(item[0]))
+            }
+            for column in groups
+        },
+    }
+
+
+def get_window_total(
+    prefix_sums: dict, start_date: datetime | None = None, end_date: datetime | None = None
+) -> dict[str, float]:
+    """Функция для получения сумм и числа операций с start_date по end_date включительно (два двоичных поиска)."""
+    dates = prefix_sums["dates"]
+    start = dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), "left") if start_date is not None else 0
+    end = dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), "right") if end_date is not None else len(dates)
+    end = max(start, end)
+    return {
+        **{name: float(sums[end] - sums[start]) for name, sums in prefix_sums["sums"].items()},
+        "count": int(end - start),
+    }
+
+
+def get_window_totals(
+    totals: dict, column: str, start_date: datetime | None = None, end_date: datetime | None = None
+) -> dict[Any, dict[str, float]]:
+    """Функция для получения сумм за период по каждому значению колонки (только значения с операциями в периоде)."""
+    logger.info(f"Getting totals by {column} from {start_date} to {end_date}")
+    window_totals = {
+        value: get_window_total(prefix_sums, start_date, end_date)
+        for value, prefix_sums in totals["groups"][column].items()
+    }
+    return {value: window_total for value, window_total in window_totals.items() if window_total["count"]}
+
+
+def publish_array(array: np.ndarray, segments: list[SharedMemory]) -> dict:
+    """Функция для копирования массива в новый сегмент разделяемой памяти."""
+    array = np.ascontiguousarray(array)
+    segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=segment.buf)[:] = array
+    segments.append(segment)
+    return {"name": segment.name, "dtype": array.dtype.str, "shape": array.shape}
+
+
+def attach_array(info: dict, segments: list[SharedMemory]) -> np.ndarray:
+    """Функция для получения массива только для чтения поверх существующего сегмента разделяемой памяти."""
+    segment = SharedMemory(name=info["name"])
+    segments.append(segment)
+    array: np.ndarray = np.ndarray(info["shape"], np.dtype(info["dtype"]), buffer=segment.buf)
+    array.flags.writeable = False
+    return array
+
+
+def share_operations(df: pd.DataFrame) -> tuple[list[SharedMemory], dict]:
+    """Функция для публикации колонок датафрейма в разделяемую память (один раз, в родительском процессе)."""
+    segments: list[SharedMemory] = []
+    columns = []
+    for name, column in df.items():
+        if column.dtype == object:
+            # строки не копируются в процессы построчно (с изменением счетчиков ссылок на каждой странице памяти):
+            # процессы получают категориальную колонку с кодами в разделяемой памяти и общими значениями
+            column = column.astype("category")
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = publish_array(column.cat.codes.to_numpy(), segments)
+            columns.append({"name": name, "kind": "category", "codes": codes, "dtype": column.dtype})
+        elif isinstance(column.dtype, pd.core.dtypes.dtypes.BaseMaskedDtype):
+            values = publish_array(column.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0), segments)
+            mask = publish_array(column.isna().to_numpy(), segments)
+            columns.append({"name": name, "kind": "masked", "values": values, "mask": mask, "dtype": column.dtype})
+        else:
+            columns.append({"name": name, "kind": "numpy", "values": publish_array(column.to_numpy(), segments)})
+
+    size = sum(segment.size for segment in segments)
+    logger.info(f"Published {len(columns)} columns to shared memory ({size // 1024} KB)")
+    return segments, {"columns": columns, "attrs": dict(df.attrs)}
+
+
+def attach_operations(spec: dict) -> tuple[pd.DataFrame, list[SharedMemory]]:
+    """Функция для сборки датафрейма (только для чтения) поверх разделяемой памяти без копирования колонок."""
+    segments: list[SharedMemory] = []
+    data = {}
+    for column in spec["columns"]:
+        if column["kind"] == "category":
+            codes = attach_array(column["codes"], segments)
+            data[column["name"]] = pd.Categorical.from_codes(codes, dtype=column["dtype"])
+        elif column["kind"] == "masked":
+            values = attach_array(column["values"], segments)
+            mask = attach_array(column["mask"], segments)
+            data[column["name"]] = column["dtype"].construct_array_type()(values, mask)
+        else:
+            data[column["name"]] = attach_array(column["values"], segments)
+
+    df = pd.DataFrame(data, copy=False)
+    df.attrs.update(spec["attrs"])
+    return df, segments
+
+
+def release_operations(segments: list[SharedMemory], unlink: bool = False) -> None:
+    """Функция для закрытия сегментов разделяемой памяти (и их удаления владельцем)."""
+    for segment in segments:
+        segment.close()
+        if unlink:
+            segment.unlink()
+
+
+def get_file_hash(file_path: str) -> str:
+    """Функция для подсчета хеша содержимого файла."""
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_data_fingerprint(df: pd.DataFrame) -> str:
+    """Функция для подсчета отпечатка содержимого датафрейма (колонок и значений), один раз для каждого датафрейма."""
+    # отпечаток запоминается вне attrs (их pandas копирует в производные датафреймы), а слабая ссылка гарантирует,
+    # что id освобожденного датафрейма, выданный новому, не вернет чужой отпечаток
+    key = id(df)
+    cached = data_fingerprints.get(key)
+    if cached is not None and cached[0]() is df and cached[1] == df.shape:
+        return cached[2]
+
+    data_hash = hashlib.sha256("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    data_hash.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    data_fingerprints[key] = (
+        weakref.ref(df, lambda ref: data_fingerprints.pop(key, None)),
+        df.shape,
+        data_hash.hexdigest(),
+    )
+    return data_hash.hexdigest()
+
+
+def count_operations_until(df: pd.DataFrame, end_date: datetime) -> int:
+    """Функция для подсчета операций не позднее end_date (для отсортированных данных - двоичным поиском)."""
+    dates = get_operation_dates(df)
+    if is_sorted_by_date(df):
+        return int(dates.searchsorted(pd.Timestamp(end_date), side="right"))
+    return int((dates <= end_date).sum())
+
+
+def get_cache_paths(file_path: str) -> tuple[str, str]:
+    """Функция для получения путей к кэшу данных и к файлу с отпечатком исходного файла."""
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:12]
+    base_path = os.path.join(CACHE_DIR, f"{file_name}-{path_hash}")
+    return f"{base_path}.pkl", f"{base_path}.json"
+
+
+def read_cache(file_path: str) -> pd.DataFrame | None:
+    """Функция для чтения данных из кэша, если исходный файл не изменился."""
+    data_path, meta_path = get_cache_paths(file_path)
+    try:
+        with open(meta_path, encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        stat = os.stat(file_path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if stat.st_size != meta.get("size") or meta.get("version") != CACHE_VERSION:
+        return None
+
+    if stat.st_mtime_ns != meta.get("mtime"):
+        logger.info(f"Modification time of {file_path} changed. Checking file hash")
+        if get_file_hash(file_path) != meta.get("sha256"):
+            return None
+        meta["mtime"] = stat.st_mtime_ns
+        with open(meta_path, "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+
+    try:
+        return pd.read_pickle(data_path)
+    except Exception as ex:
+        logger.warning(f"Failed to read cache {data_path}: {ex}")
+        return None
+
+
+def write_cache(file_path: str, df: pd.DataFrame, extra_meta: dict | None = None) -> None:
+    """Функция для записи данных в кэш вместе с отпечатком исходного файла (размер, время изменения, хеш)."""
+    data_path, meta_path = get_cache_paths(file_path)
+    stat = os.stat(file_path)
+    meta = {"source": os.path.abspath(file_path), "version": CACHE_VERSION, "size": stat.st_size}
+    meta["mtime"] = stat.st_mtime_ns
+    meta["sha256"] = get_file_hash(file_path)
+    meta.update(extra_meta or {})
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_pickle(f"{data_path}.tmp")
+    os.replace(f"{data_path}.tmp", data_path)
+    with open(meta_path, "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file)
+
+
+def get_data_from_xlsx(file_path: str, use_cache: bool = True, incremental: bool = False) -> pd.DataFrame | None:
+    """Функция для считывания инфы из excel-файла (или из папки/glob-шаблона) с кэшированием результата на диске."""
+    if os.path.isdir(file_path) or glob.has_magic(file_path):
+        return get_data_from_many_xlsx(file_path, use_cache)
 
-def get_data_from_xlsx(file_path: str) -> pd.DataFrame | None:
-    """Функция для считывания инфы из excel-файла."""
     try:
+        if use_cache and os.path.isfile(file_path):
+            df = read_cache(file_path)
+            if df is not None:
+                logger.info(f"Cache hit for {file_path}")
+                return df
+            logger.info(f"Cache miss for {file_path}")
+
+            if incremental:
+                return ingest_xlsx_incrementally(file_path)
+
         logger.info(f"Trying to read info form {file_path}")
-        df = pd.read_excel(file_path)
+        df = sort_by_date(apply_schema(pd.read_excel(file_path)))
         logger.info("Successful operation")
+
+        if use_cache and os.path.isfile(file_path):
+            try:
+                write_cache(file_path, df)
+                logger.info(f"Cache for {file_path} updated")
+            except OSError as ex:
+                logger.warning(f"Failed to write cache for {file_path}: {ex}")
         return df
     except FileNotFoundError as ex:
         logger.error(ex)
         print("Файл не найден. Проверьте правильность введенных данных.")
-        data = {
-            "Дата операции": [np.nan],
-            "Дата платежа": [np.nan],
-            "Номер карты": [np.nan],
-            "Статус": [np.nan],
-            "Сумма операции": [np.nan],
-            "Валюта операции": [np.nan],
-            "Сумма платежа": [np.nan],
-            "Валюта платежа": [np.nan],
-            "Кэшбэк": [np.nan],
-            "Категория": [np.nan],
-            "MCC": [np.nan],
-            "Описание": [np.nan],
-            "Бонусы (включая кэшбэк)": [np.nan],
-            "Округление на инвесткопилку": [np.nan],
-            "Сумма операции с округлением": [np.nan],
-        }
-        return pd.DataFrame(data)
+        return get_empty_df()
+
+
+def get_data_from_many_xlsx(path: str, use_cache: bool = True, workers: int | None = None) -> pd.DataFrame:
+    """Функция для параллельного считывания инфы из всех excel-файлов папки или glob-шаблона."""
+    pattern = os.path.join(path, "*.xlsx") if os.path.isdir(path) else path
+    file_paths = sorted(
+        file for file in glob.glob(pattern) if os.path.isfile(file) and not os.path.basename(file).startswith("~$")
+    )
+    if not file_paths:
+        logger.error(f"No excel files found by {pattern}")
+        print("Файл не найден. Проверьте правильность введенных данных.")
+        return get_empty_df()
+
+    frames = {file: read_cache(file) if use_cache else None for file in file_paths}
+    files_to_parse = [file for file, frame in frames.items() if frame is None]
+    logger.info(f"Cache hit for {len(file_paths) - len(files_to_parse)} of {len(file_paths)} files")
+
+    if len(files_to_parse) > 1:
+        logger.info(f"Trying to read {len(files_to_parse)} files in a process pool")
+        mp_context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+            parsed_frames = executor.map(get_data_from_xlsx, files_to_parse, [use_cache] * len(files_to_parse))
+            frames.update(zip(files_to_parse, parsed_frames))
+    else:
+        frames.update((file, get_data_from_xlsx(file, use_cache)) for file in files_to_parse)
+
+    logger.info("Concatenating data from all files")
+    return sort_by_date(
+        concat_operations(
+            [
+                frame.assign(source=pd.Categorical([os.path.basename(file)] * len(frame)))
+                for file, frame in frames.items()
+                if frame is not None
+            ]
+        )
+    )
+
+
+def ingest_xlsx_incrementally(file_path: str) -> pd.DataFrame:
+    """Функция для дозагрузки строк, добавленных в конец excel-файла, к ранее загруженным данным."""
+    data_path, meta_path = get_cache_paths(file_path)
+    try:
+        with open(meta_path, encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        ingested_rows, prefix_hash = meta["rows"], meta["rows_sha256"]
+        df = pd.read_pickle(data_path) if meta.get("version") == CACHE_VERSION else None
+    except Exception:
+        df = None
+
+    if df is None:
+        logger.info(f"No ingested data found for {file_path}")
+        ingested_rows, prefix_hash = 0, ""
+
+    logger.info(f"Trying to read rows of {file_path} appended after row {ingested_rows}")
+    new_data = read_appended_rows(file_path, ingested_rows, prefix_hash)
+
+    if new_data is None:
+        logger.warning(f"Already ingested rows of {file_path} changed. Reloading the whole file")
+        new_data = read_appended_rows(file_path, 0, "")
+        df = None
+    if new_data is None:
+        logger.error(f"Failed to read rows of {file_path}")
+        return get_empty_df()
+
+    new_rows, total_rows, rows_hash = new_data
+    logger.info(f"Ingested {len(new_rows)} new rows")
+    if df is None:
+        df = sort_by_date(new_rows)
+    elif not new_rows.empty:
+        df, _ = append_operations(df, new_rows)
+
+    try:
+        write_cache(file_path, df, {"rows": total_rows, "rows_sha256": rows_hash})
+        logger.info(f"Cache for {file_path} updated")
+    except OSError as ex:
+        logger.warning(f"Failed to write cache for {file_path}: {ex}")
+    return df
+
+
+def read_appended_rows(file_path: str, ingested_rows: int, prefix_hash: str) -> tuple[pd.DataFrame, int, str] | None:
+    """Функция для чтения строк excel-файла после ingested_rows с проверкой контрольной суммы уже прочитанных строк."""
+    rows = read_xlsx_rows(file_path)
+    columns = list(next(rows, []))
+    rows_hash = hashlib.sha256()
+    new_rows = []
+    total_rows = 0
+
+    for total_rows, row in enumerate(rows, start=1):
+        rows_hash.update(repr(row).encode("utf-8"))
+        if total_rows > ingested_rows:
+            new_rows.append(row)
+        elif total_rows == ingested_rows and rows_hash.hexdigest() != prefix_hash:
+            rows.close()
+            return None
+
+    if total_rows < ingested_rows:
+        return None
+    return get_typed_chunk(new_rows, columns), total_rows, rows_hash.hexdigest()
+
+
+def read_xlsx_rows(file_path: str) -> Generator[tuple, None, None]:
+    """Функция-генератор для построчного чтения excel-файла (первая строка - заголовок)."""
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_xlsx_by_chunks(file_path: str, chunk_size: int = 10000) -> Iterator[pd.DataFrame]:
+    """Функция-генератор для потокового чтения excel-файла частями по chunk_size строк."""
+    logger.info(f"Trying to read info form {file_path} by chunks of {chunk_size} rows")
+    rows = read_xlsx_rows(file_path)
+    columns = list(next(rows, []))
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield get_typed_chunk(chunk, columns)
+            chunk = []
+    if chunk:
+        yield get_typed_chunk(chunk, columns)
+    logger.info("Successful operation")
+
+
+def get_typed_chunk(rows: list[tuple], columns: list[str]) -> pd.DataFrame:
+    """Функция для формирования датафрейма из строк excel-файла с приведением колонок к типам схемы."""
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    for column in chunk.columns:
+        if column not in NUMERIC_COLUMNS:
+            chunk[column] = chunk[column].where(chunk[column].notna(), np.nan)
+    return apply_schema(chunk)
 
 
 def filter_by_date(current_date: str, df: pd.DataFrame) -> pd.DataFrame:
@@ -56,32 +811,27 @@ def filter_by_date(current_date: str, df: pd.DataFrame) -> pd.DataFrame:
         end_date = datetime.strptime(current_date, "%d.%m.%Y %H:%M:%S")
         start_time = datetime.strptime(f"01.{end_date.month}.{end_date.year} 00:00:00", "%d.%m.%Y %H:%M:%S")
 
-        logger.info("Formatting dates in df")
-        df["date"] = df["Дата операции"].map(lambda x: datetime.strptime(str(x), "%d.%m.%Y %H:%M:%S"))
-        logger.info(f"Getting operations from {start_time} to {end_date}")
-        return df[(df["date"] >= start_time) & (df["date"] <= end_date)]
-
     except ValueError as ex:
         logger.error(ex)
         print("Неправильный формат даты. Введите дату в формате DD.MM.YY HH:MM:SS")
-        data = {
-            "Дата операции": [np.nan],
-            "Дата платежа": [np.nan],
-            "Номер карты": [np.nan],
-            "Статус": [np.nan],
-            "Сумма операции": [np.nan],
-            "Валюта операции": [np.nan],
-            "Сумма платежа": [np.nan],
-            "Валюта платежа": [np.nan],
-            "Кэшбэк": [np.nan],
-            "Категория": [np.nan],
-            "MCC": [np.nan],
-            "Описание": [np.nan],
-            "Бонусы (включая кэшбэк)": [np.nan],
-            "Округление на инвесткопилку": [np.nan],
-            "Сумма операции с округлением": [np.nan],
-        }
-        return pd.DataFrame(data)
+        return get_empty_df()
+
+    if "date" not in df or not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df = df.assign(date=get_operation_dates(df))
+    logger.info(f"Getting operations from {start_time} to {end_date}")
+    return query_operations(df, start_date=start_time, end_date=end_date)
+
+
+def filter_chunks_by_date(current_date: str, chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Функция для фильтрации операций с начала месяца по текущую дату при потоковом чтении данных."""
+    try:
+        datetime.strptime(current_date, "%d.%m.%Y %H:%M:%S")
+    except ValueError:
+        return filter_by_date(current_date, pd.DataFrame())
+
+    filtered_chunks = [filter_by_date(current_date, chunk) for chunk in chunks]
+    logger.info(f"Concatenating operations filtered from {len(filtered_chunks)} chunks")
+    return concat_operations(filtered_chunks) if filtered_chunks else pd.DataFrame()
 
 
 def sort_by_amount(df: pd.DataFrame) -> list[dict]:
@@ -95,17 +845,35 @@ def sort_by_amount(df: pd.DataFrame) -> list[dict]:
     return sorted_by_expenses_desc.to_dict(orient="records")
 
 
-def get_total_expenses(df: pd.DataFrame) -> dict[str, float]:
-    """Функция для получения общей суммы расходов по каждой карте."""
+def get_payments_by_card(df: pd.DataFrame) -> pd.Series:
+    """Функция для получения суммы платежей (с учетом знака) по каждой карте."""
+    if "card" in df:
+        logger.info("Grouping operations by normalized card numbers")
+        return df.groupby("card", observed=True)["Сумма платежа"].sum()
+
     df_copy = df.loc[::]
     logger.info("Formating card numbers")
     df_copy["Formated card numbers"] = df_copy["Номер карты"].map(lambda x: str(x).replace("*", ""))
     logger.info("Grouping operations by card numbers")
-    grouped_data = df_copy.groupby("Formated card numbers")["Сумма платежа"].sum().map(lambda x: -x if x < 0 else x)
+    return df_copy.groupby("Formated card numbers")["Сумма платежа"].sum()
+
+
+def get_total_expenses(df: pd.DataFrame) -> dict[str, float]:
+    """Функция для получения общей суммы расходов по каждой карте."""
+    grouped_data = get_payments_by_card(df).map(lambda x: -x if x < 0 else x)
     logger.info("Returning result in a form of dict")
     return grouped_data.to_dict()
 
 
+def get_total_expenses_by_chunks(chunks: Iterable[pd.DataFrame]) -> dict[str, float]:
+    """Функция для получения общей суммы расходов по каждой карте при потоковом чтении данных."""
+    payments = pd.Series(dtype=float)
+    for chunk in chunks:
+        payments = payments.add(get_payments_by_card(chunk), fill_value=0)
+    logger.info("Returning result in a form of dict")
+    return payments.map(lambda x: -x if x < 0 else x).to_dict()
+
+
 def calculate_cashback(operations_dict: dict) -> dict:
     """Функция, считающая кэшбэк (1 рубль на каждые 100 рублей)."""
     logger.info("Calculating cashback for each card and adding this info to the dict")
@@ -146,6 +914,52 @@ def process_cards_info(operations_dict: dict) -> list[dict]:
     ]
 
 
+def get_cards_summary(df: pd.DataFrame, aggregates: Iterable[str] = ()) -> list[dict]:
+    """Функция для вывода информации по каждой карте (сумма расходов, кэшбэк и доп. агрегаты) за один проход."""
+    aggregates = list(aggregates)
+    for aggregate in aggregates:
+        if aggregate not in CARD_AGGREGATES:
+            logger.warning(f"Unknown aggregate {aggregate} is skipped")
+    aggregates = [aggregate for aggregate in CARD_AGGREGATES if aggregate in aggregates]
+
+    grouped_data = aggregate_operations(df, "card", "Сумма платежа", ["sum", *aggregates])
+
+    logger.info("Returning cards summary")
+    cards = []
+    for card, row in zip(grouped_data.index.astype(str), grouped_data.to_dict(orient="records")):
+        total_spent = abs(row["sum"])
+        card_info = {
+            "last_digits": card,
+            "total_spent": round(total_spent, 2),
+            "cashback": round(total_spent / 100, 2),
+        }
+        card_info.update(
+            {
+                aggregate: (
+                    int(row[aggregate])
+                    if aggregate == "count"
+                    else None if pd.isna(row[aggregate]) else round(row[aggregate], 2)
+                )
+                for aggregate in aggregates
+            }
+        )
+        cards.append(card_info)
+    return cards
+
+
+def get_cards_summary_by_totals(
+    totals: dict, start_date: datetime | None = None, end_date: datetime | None = None
+) -> list[dict]:
+    """Функция для вывода информации по каждой карте за период по накопленным суммам."""
+    cards = []
+    for card, window_total in get_window_totals(totals, "card", start_date, end_date).items():
+        total_spent = abs(window_total["Сумма платежа"])
+        cards.append(
+            {"last_digits": str(card), "total_spent": round(total_spent, 2), "cashback": round(total_spent / 100, 2)}
+        )
+    return cards
+
+
 def get_top_five_transactions(transactions_list: list[dict]) -> list[dict]:
     """Функция для вывода топ-5 транзакций по сумме платежа."""
     logger.info("Formatting result")
@@ -160,6 +974,47 @@ def get_top_five_transactions(transactions_list: list[dict]) -> list[dict]:
     ]
 
 
+def select_top_transactions(df: pd.DataFrame, n: int = 5) -> list[tuple[float, dict]]:
+    """Функция для выбора топ-n транзакций по абсолютной сумме операции (возвращает пары сумма-транзакция)."""
+    logger.info(f"Selecting top {n} transactions by abs transactions sum")
+    amounts = np.nan_to_num(np.abs(df["Сумма операции"].to_numpy(dtype=float)), nan=-np.inf)
+    if n <= 0:
+        return []
+    if n < len(amounts):
+        positions = np.argpartition(-amounts, n - 1)[:n]
+    else:
+        positions = np.arange(len(amounts))
+    positions = positions[np.argsort(-amounts[positions], kind="stable")]
+
+    logger.info("Formatting result")
+    winners = df.iloc[positions, df.columns.get_indexer(["Дата платежа", "Сумма платежа", "Категория", "Описание"])]
+    winners = winners.astype(object)
+    winners = winners.where(winners.notna(), None)
+    return [
+        (amount_key, {"date": date, "amount": amount, "category": category, "description": description})
+        for amount_key, (date, amount, category, description) in zip(
+            amounts[positions].tolist(), winners.itertuples(index=False, name=None)
+        )
+    ]
+
+
+def merge_top_transactions(partial_results: Iterable[list[tuple[float, dict]]], n: int = 5) -> list[dict]:
+    """Функция для объединения топ-n транзакций, выбранных из разных частей данных."""
+    logger.info(f"Merging partial top {n} transactions")
+    top_transactions = heapq.nlargest(n, chain.from_iterable(partial_results), key=itemgetter(0))
+    return [transaction for _, transaction in top_transactions]
+
+
+def get_top_transactions(df: pd.DataFrame, n: int = 5) -> list[dict]:
+    """Функция для вывода топ-n транзакций по сумме платежа."""
+    return [transaction for _, transaction in select_top_transactions(df, n)]
+
+
+def get_top_transactions_by_chunks(chunks: Iterable[pd.DataFrame], n: int = 5) -> list[dict]:
+    """Функция для вывода топ-n транзакций по сумме платежа при потоковом чтении данных."""
+    return merge_top_transactions((select_top_transactions(chunk, n) for chunk in chunks), n)
+
+
 def get_currencies(currencies_file: str) -> list:
     """Функция для получения списка существующих валют."""
     try:
@@ -234,21 +1089,80 @@ def get_data_from_user(user_currencies: str, user_stocks: str) -> None | str:
         json.dump(user_settings, of)
 
 
-def get_data_via_api_currencies(currencies: list[str]) -> tuple:
-    """Функция для получения текущего курса валют."""
-    url = "https://www.cbr-xml-daily.ru/daily_json.js"
+def read_json_cache(file_name: str) -> dict:
+    """Функция для чтения JSON-кэша из папки кэша."""
+    try:
+        with open(os.path.join(CACHE_DIR, file_name), encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if not isinstance(cache, dict):
+        logger.warning(f"Cache file {file_name} does not contain an object. Ignoring it")
+        return {}
+    return cache
+
+
+def write_json_cache(file_name: str, data: dict) -> None:
+    """Функция для записи JSON-кэша в папку кэша."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        cache_path = os.path.join(CACHE_DIR, file_name)
+        with open(f"{cache_path}.tmp", "w", encoding="utf-8") as cache_file:
+            json.dump(data, cache_file, ensure_ascii=False)
+        os.replace(f"{cache_path}.tmp", cache_path)
+    except OSError as ex:
+        logger.warning(f"Failed to write cache {file_name}: {ex}")
+
+
+def get_currencies_rates(currencies_data: dict, currencies: list[str]) -> list[float]:
+    """Функция для выбора курсов валют пользователя из данных ЦБ."""
+    currencies_rates = [currencies_data.get(currency, {}).get("Value") for currency in currencies]
+    logger.info(f"Returning rates for user's currencies: {currencies}.")
+    return list(map(lambda x: round(x, 2), currencies_rates))
+
+
+def get_data_via_api_currencies(currencies: list[str], ttl: float = CURRENCIES_CACHE_TTL) -> tuple:
+    """Функция для получения текущего курса валют (с кэшированием на диске на время ttl секунд)."""
+    cache = read_json_cache(CURRENCIES_CACHE_FILE)
+    cached_rates = cache.get("rates", {}).get(cache.get("date"))
+
+    if cached_rates is not None and time.time() - cache.get("fetched_at", 0) < ttl:
+        logger.info(f"Using cached currencies rates published {cache.get('date')}.")
+        return True, get_currencies_rates(cached_rates, currencies)
+
+    headers = {}
+    if cached_rates is not None and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cached_rates is not None and cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
 
     logger.info("Trying to get current currencies rates.")
     try:
-        response = requests.get(url)
+        response = http_get(CURRENCIES_URL, "currencies", headers=headers)
         status_code = response.status_code
 
+        if status_code == 304 and cached_rates is not None:
+            logger.info("Currencies rates not modified. Using cached rates.")
+            write_json_cache(CURRENCIES_CACHE_FILE, {**cache, "fetched_at": time.time()})
+            return True, get_currencies_rates(cached_rates, currencies)
+
         if status_code == 200:
             logger.info("Current currencies rates got successfully.")
-            currencies_data = response.json()["Valute"]
-            currencies_rates = [currencies_data.get(currency, {}).get("Value") for currency in currencies]
-            logger.info(f"Returning rates for user's currencies: {currencies}.")
-            return True, list(map(lambda x: round(x, 2), currencies_rates))
+            data = response.json()
+            currencies_data = data["Valute"]
+            publication_date = data.get("Date", "")
+            rates = {**cache.get("rates", {}), publication_date: currencies_data}
+            write_json_cache(
+                CURRENCIES_CACHE_FILE,
+                {
+                    "date": publication_date,
+                    "fetched_at": time.time(),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "rates": dict(sorted(rates.items())[-CURRENCIES_CACHE_DAYS:]),
+                },
+            )
+            return True, get_currencies_rates(currencies_data, currencies)
 
         logger.warning(f"Operation failed. Reason: {response.reason}")
         return False, str(response.reason)
@@ -258,23 +1172,24 @@ def get_data_via_api_currencies(currencies: list[str]) -> tuple:
         return False, str(ex)
 
 
-def get_data_via_api_stocks(stocks: list[str]) -> tuple:
-    """Функция для получения текущей стоимости акций S&P 500."""
+def fetch_stocks_index() -> tuple:
+    """Функция для загрузки списка акций и построения индекса цен по тикеру."""
     load_dotenv()
 
-    url = f"https://financialmodelingprep.com/api/v3/stock/list?apikey={os.getenv("API_KEY")}"
-
     logger.info("Trying to get stocks list.")
     try:
-        response = requests.get(url)
+        response = http_get(STOCKS_URL, "stocks", params={"apikey": os.getenv("API_KEY")})
         status_code = response.status_code
 
         if status_code == 200:
             logger.info("Stocks list got successfully.")
-            stocks_data = response.json()
-            stocks_prices = [i.get("price") for i in stocks_data for stock in stocks if i.get("symbol") == stock]
-            logger.info(f"Returning prices of user's stocks: {stocks}.")
-            return True, stocks_prices
+            prices = {stock.get("symbol"): stock.get("price") for stock in response.json()}
+            fetched_at = time.time()
+            with stocks_index_lock:
+                stocks_index.prices, stocks_index.fetched_at = prices, fetched_at
+            write_json_cache(STOCKS_CACHE_FILE, {"fetched_at": fetched_at, "prices": prices})
+            logger.info(f"Stocks index built for {len(prices)} symbols.")
+            return True, prices
 
         logger.warning(f"Operation failed. Reason: {response.reason}")
         return False, str(response.reason)
@@ -284,6 +1199,43 @@ def get_data_via_api_stocks(stocks: list[str]) -> tuple:
         return False, str(ex)
 
 
+def refresh_stocks_index_in_background() -> threading.Thread:
+    """Функция для обновления индекса цен акций в фоновом потоке."""
+    with stocks_index_lock:
+        refresh = stocks_index.refresh
+        if refresh is None or not refresh.is_alive():
+            logger.info("Refreshing stale stocks index in background.")
+            refresh = threading.Thread(target=fetch_stocks_index, daemon=True)
+            stocks_index.refresh = refresh
+            refresh.start()
+    return refresh
+
+
+def get_stocks_index() -> tuple[dict | None, float]:
+    """Функция для получения индекса цен акций из памяти или с диска."""
+    with stocks_index_lock:
+        if stocks_index.prices is None:
+            cache = read_json_cache(STOCKS_CACHE_FILE)
+            if "prices" in cache:
+                stocks_index.prices, stocks_index.fetched_at = cache["prices"], cache.get("fetched_at", 0.0)
+        return stocks_index.prices, stocks_index.fetched_at
+
+
+def get_data_via_api_stocks(stocks: list[str], ttl: float = STOCKS_CACHE_TTL) -> tuple:
+    """Функция для получения текущей стоимости акций S&P 500."""
+    prices, fetched_at = get_stocks_index()
+
+    if prices is None:
+        status, prices = fetch_stocks_index()
+        if not status:
+            return False, prices
+    elif time.time() - fetched_at >= ttl:
+        refresh_stocks_index_in_background()
+
+    logger.info(f"Returning prices of user's stocks: {stocks}.")
+    return True, [prices.get(stock) for stock in stocks]
+
+
 def get_exchange_rates(currencies: list[str]) -> list[dict]:
     """Функция для вывода курса валют."""
     logger.info("Trying to get currencies rates.")
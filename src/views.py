@@ -1,14 +1,166 @@
 import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
+from typing import Callable
 
 import pandas as pd
 
-from src.utils import (calculate_cashback, filter_by_date, get_exchange_rates, get_stock_prices,
-                       get_top_five_transactions, get_total_expenses, process_cards_info, say_hello, sort_by_amount)
+from src.utils import (count_operations_until, filter_by_date, get_cards_summary, get_cards_summary_by_totals,
+                       get_data_fingerprint, get_exchange_rates, get_stock_prices, get_top_transactions, say_hello)
 
+log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "views.log")
 
-def generate_json_response(date: str, df: pd.DataFrame) -> str:
+logger = logging.getLogger("views")
+logger.setLevel(logging.INFO)
+file_handler = logging.FileHandler(log_file_path, mode="w")
+file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(message)s")
+
+file_handler.setFormatter(file_formatter)
+logger.addHandler(file_handler)
+
+PAGE_BUDGET = 3.0
+RATES_DEADLINE = 5.0
+STOCKS_DEADLINE = 5.0
+RATES_TTL = 30 * 60
+STOCKS_TTL = 5 * 60
+PAGE_CACHE_SIZE = 32
+MARKET_WORKERS = 4
+
+MarketSection = tuple[str, Callable[[list[str]], list[dict]], list[str], float, float]
+
+last_sections: dict[tuple, tuple[list[dict], float]] = {}
+page_cache: OrderedDict[tuple, dict] = OrderedDict()
+settings_cache: dict[str, tuple[tuple[int, int] | None, dict]] = {}
+cache_lock = threading.Lock()
+# зависший внешний API занимает не больше MARKET_WORKERS потоков: запрос раздела, который еще выполняется,
+# не запускается повторно, а его результата дожидаются все страницы
+market_executor = ThreadPoolExecutor(max_workers=MARKET_WORKERS, thread_name_prefix="market")
+market_fetches: dict[tuple, Future[list[dict] | None]] = {}
+
+
+def read_user_settings(settings_path: str) -> dict:
+    """Функция для чтения настроек пользователя, повторно читающая файл только после его изменения."""
+    try:
+        stat = os.stat(settings_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = None
+
+    cached = settings_cache.get(settings_path)
+    if version is not None and cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(settings_path) as settings_file:
+        user_settings: dict = json.load(settings_file)
+    settings_cache[settings_path] = (version, user_settings)
+    return user_settings
+
+
+def get_fresh_section(name: str, items: list[str] | None, ttl: float) -> list[dict] | None:
+    """Функция для получения раздела рыночных данных из кэша, если он моложе ttl секунд."""
+    with cache_lock:
+        cached = last_sections.get((name, tuple(items or ())))
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    return None
+
+
+def get_local_sections(df: pd.DataFrame, formated_date: str, hour: int, totals: dict | None = None) -> dict:
+    """Функция для получения разделов страницы, не зависящих от сети, из LRU-кэша или их расчета."""
+    # в пределах часа страница меняется, только если до даты появились новые операции
+    end_date = datetime.strptime(formated_date, "%d.%m.%Y %H:%M:%S")
+    key = (get_data_fingerprint(df), formated_date[:13], count_operations_until(df, end_date))
+
+    with cache_lock:
+        sections = page_cache.get(key)
+        if sections is not None:
+            page_cache.move_to_end(key)
+            logger.info("Home page cache hit.")
+            return sections
+
+    current_month_operations = filter_by_date(formated_date, df)
+
+    if totals is not None and totals["rows"] == len(df):
+        cards = get_cards_summary_by_totals(totals, end_date.replace(day=1, hour=0, minute=0, second=0), end_date)
+    else:
+        cards = get_cards_summary(current_month_operations)
+
+    sections = {
+        "greeting": say_hello(hour),
+        "cards": cards,
+        "top_transactions": get_top_transactions(current_month_operations),
+    }
+    with cache_lock:
+        page_cache[key] = sections
+        if len(page_cache) > PAGE_CACHE_SIZE:
+            page_cache.popitem(last=False)
+    return sections
+
+
+def get_market_future(
+    name: str, fetch: Callable[[list[str]], list[dict]], items: list[str]
+) -> Future[list[dict] | None]:
+    """Функция для запуска фонового запроса раздела рыночных данных (или получения уже выполняющегося запроса)."""
+    key = (name, tuple(items or ()))
+    with cache_lock:
+        future = market_fetches.get(key)
+        if future is not None:
+            return future
+        future = market_executor.submit(fetch, items)
+        market_fetches[key] = future
+    # колбэк завершенной задачи вызывается сразу, поэтому он добавляется вне блокировки
+    future.add_done_callback(lambda done: forget_market_future(key, done))
+    return future
+
+
+def forget_market_future(key: tuple, future: Future[list[dict] | None]) -> None:
+    """Функция для удаления завершенного запроса раздела из списка выполняющихся."""
+    with cache_lock:
+        if market_fetches.get(key) is future:
+            del market_fetches[key]
+
+
+def get_result_by_deadline(
+    future: Future[list[dict] | None], name: str, started_at: float, deadline: float
+) -> list[dict] | None:
+    """Функция для получения результата фоновой задачи не позднее deadline секунд от ее запуска."""
+    try:
+        return future.result(timeout=max(0.0, started_at + deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.warning(f"Section {name} missed its deadline of {deadline} s.")
+    except Exception as ex:
+        logger.error(f"Section {name} failed: {ex}")
+    return None
+
+
+def get_market_section(
+    future: Future[list[dict] | None], name: str, items: list[str] | None, started_at: float, deadline: float
+) -> tuple[list[dict] | None, str]:
+    """Функция для получения раздела рыночных данных (или последнего удачного значения) в пределах бюджета страницы."""
+    key = (name, tuple(items or ()))
+    value = get_result_by_deadline(future, name, started_at, min(deadline, PAGE_BUDGET))
+
+    with cache_lock:
+        if value is not None:
+            last_sections[key] = (value, time.monotonic())
+            return value, "ok"
+        cached = last_sections.get(key)
+
+    if cached is not None:
+        logger.info(f"Serving stale {name}.")
+        return cached[0], "stale"
+
+    logger.warning(f"Section {name} is unavailable. Omitting it.")
+    return None, "unavailable"
+
+
+def generate_json_response(date: str, df: pd.DataFrame, totals: dict | None = None) -> str:
     """Основная функция для страницы Главная."""
 
     file_path = os.path.dirname(os.path.dirname(__file__))
@@ -22,18 +174,31 @@ def generate_json_response(date: str, df: pd.DataFrame) -> str:
         print("Неправильный формат даты. Введите дату в формате YYYY-MM-DD HH:MM:SS")
 
     else:
-        with open(os.path.join(file_path, "user_settings.json")) as settings_file:
-            user_settings = json.load(settings_file)
-
-        current_month_operations = filter_by_date(formated_date, df)
-        current_month_expenses = calculate_cashback(get_total_expenses(current_month_operations))
-
-        result = {
-            "greeting": say_hello(hour),
-            "cards": process_cards_info(current_month_expenses),
-            "top_transactions": get_top_five_transactions(sort_by_amount(current_month_operations)),
-            "currency_rates": get_exchange_rates(user_settings.get("user_currencies")),
-            "stock_prices": get_stock_prices(user_settings.get("user_stocks")),
+        user_settings = read_user_settings(os.path.join(file_path, "user_settings.json"))
+
+        started_at = time.monotonic()
+        currencies, stocks = user_settings.get("user_currencies", []), user_settings.get("user_stocks", [])
+        market_sections: tuple[MarketSection, ...] = (
+            ("currency_rates", get_exchange_rates, currencies, RATES_DEADLINE, RATES_TTL),
+            ("stock_prices", get_stock_prices, stocks, STOCKS_DEADLINE, STOCKS_TTL),
+        )
+        cached = {name: get_fresh_section(name, items, ttl) for name, _, items, _, ttl in market_sections}
+
+        futures = {
+            name: get_market_future(name, fetch, items)
+            for name, fetch, items, *_ in market_sections
+            if cached[name] is None
         }
 
-        return json.dumps(result, ensure_ascii=False, indent=4)
+        result = dict(get_local_sections(df, formated_date, hour, totals))
+        status = {}
+        for name, _, items, deadline, _ in market_sections:
+            value, status[name] = cached[name], "ok"
+            if value is None:
+                value, status[name] = get_market_section(futures[name], name, items, started_at, deadline)
+            if value is not None:
+                result[name] = value
+        result["status"] = status
+
+        logger.info(f"Home page generated in {time.monotonic() - started_at:.3f} s.")
+        return json.dumps(result, ensure_ascii=False, indent=4, allow_nan=False)
@@ -1,9 +1,28 @@
 import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import numpy as np
 import pandas as pd
 import pytest
 
+from src.utils import StocksIndex
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch) -> str:
+    path = str(tmp_path / "cache")
+    monkeypatch.setattr("src.utils.CACHE_DIR", path)
+    monkeypatch.setattr("src.utils.stocks_index", StocksIndex())
+    monkeypatch.setattr("src.http_client.stats", {})
+    monkeypatch.setattr("src.views.last_sections", {})
+    monkeypatch.setattr("src.views.page_cache", OrderedDict())
+    monkeypatch.setattr("src.views.settings_cache", {})
+    monkeypatch.setattr("src.views.market_fetches", {})
+    monkeypatch.setattr("src.http_client.BACKOFF_FACTOR", 0.01)
+    return path
+
 
 @pytest.fixture
 def get_df() -> pd.DataFrame:
@@ -318,5 +337,46 @@ def json_response() -> str:
             {"stock": "AAPL", "price": 216.24},
             {"stock": "AMZN", "price": 166.94},
         ],
+        "status": {"currency_rates": "ok", "stock_prices": "ok"},
     }
     return json.dumps(data, ensure_ascii=False, indent=4)
+
+
+@pytest.fixture
+def currencies_server(api_response_currencies, monkeypatch):
+    etag = '"rates-2024-08-10"'
+    last_modified = "Sat, 10 Aug 2024 08:30:00 GMT"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.requests.append(
+                {header: self.headers.get(header) for header in ("If-None-Match", "If-Modified-Since")}
+            )
+            if server.status != 200:
+                self.send_error(server.status)
+                return
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps(api_response_currencies).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setattr("src.utils.CURRENCIES_URL", f"http://127.0.0.1:{server.server_port}/daily_json.js")
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,111 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from src.http_client import CircuitOpenError, get_merged_stats, get_stats, http_get
+
+
+def make_response(status_code: int) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    return response
+
+
+@patch("src.http_client.session.get")
+def test_http_get(mock_get):
+    """Тестирует нормальную работу функции."""
+    mock_get.return_value = make_response(200)
+    assert http_get("https://example.com", "currencies").status_code == 200
+    mock_get.assert_called_once_with("https://example.com", timeout=(3.05, 10))
+    assert get_stats()["currencies"]["requests"] == 1
+    assert get_stats()["currencies"]["errors"] == 0
+
+
+@patch("src.http_client.session.get")
+def test_http_get_retries_server_errors(mock_get):
+    """Тестирует повтор запроса после ответа 5xx."""
+    mock_get.side_effect = [make_response(503), make_response(502), make_response(200)]
+    assert http_get("https://example.com", "currencies").status_code == 200
+    assert mock_get.call_count == 3
+    assert get_stats()["currencies"] | {"latency_mean": 0, "latency_max": 0} == {
+        "requests": 3,
+        "errors": 2,
+        "retries": 2,
+        "short_circuited": 0,
+        "latency_mean": 0,
+        "latency_max": 0,
+        "circuit": "closed",
+    }
+
+
+@patch("src.http_client.session.get")
+def test_http_get_retries_exhausted(mock_get):
+    """Тестирует, что после исчерпания повторов пробрасывается последняя ошибка."""
+    mock_get.side_effect = requests.exceptions.ConnectionError("Connection refused")
+    with pytest.raises(requests.exceptions.ConnectionError, match="Connection refused"):
+        http_get("https://example.com", "stocks")
+    assert mock_get.call_count == 3
+
+
+@patch("src.http_client.session.get")
+def test_http_get_client_errors_not_retried(mock_get):
+    """Тестирует, что ответы 4xx не повторяются."""
+    mock_get.return_value = make_response(403)
+    assert http_get("https://example.com", "stocks").status_code == 403
+    assert mock_get.call_count == 1
+
+
+@patch("src.http_client.BREAKER_THRESHOLD", 2)
+@patch("src.http_client.session.get")
+def test_http_get_circuit_breaker(mock_get):
+    """Тестирует быстрый отказ после серии ошибок."""
+    mock_get.side_effect = requests.exceptions.Timeout("Read timed out")
+    with pytest.raises(CircuitOpenError):
+        http_get("https://example.com", "currencies")
+    with pytest.raises(CircuitOpenError, match="Service currencies is temporarily unavailable"):
+        http_get("https://example.com", "currencies")
+    assert mock_get.call_count == 2
+    assert get_stats()["currencies"]["circuit"] == "open"
+    assert get_stats()["currencies"]["short_circuited"] == 2
+
+    with patch("src.http_client.time.monotonic", return_value=10**9):
+        mock_get.side_effect = None
+        mock_get.return_value = make_response(200)
+        assert http_get("https://example.com", "currencies").status_code == 200
+    assert get_stats()["currencies"]["circuit"] == "closed"
+
+
+@patch("src.http_client.session.get")
+def test_get_merged_stats(mock_get, tmp_path, monkeypatch):
+    """Тестирует сложение счетчиков, записанных несколькими процессами."""
+    monkeypatch.setattr("src.http_client.stats_path", str(tmp_path / "1.json"))
+    mock_get.side_effect = [make_response(503), make_response(200)]
+    http_get("https://example.com", "currencies")
+    other_process = {
+        "currencies": {
+            "requests": 2,
+            "errors": 0,
+            "retries": 0,
+            "short_circuited": 1,
+            "latency_total": 1.0,
+            "latency_max": 0.75,
+            "consecutive_failures": 0,
+            "open_until": 0.0,
+        }
+    }
+    (tmp_path / "2.json").write_text(json.dumps(other_process))
+    (tmp_path / "3.json").write_text("{")
+
+    merged = get_merged_stats(str(tmp_path))
+    assert merged["currencies"] | {"latency_mean": 0} == {
+        "requests": 4,
+        "errors": 1,
+        "retries": 1,
+        "short_circuited": 1,
+        "latency_mean": 0,
+        "latency_max": 0.75,
+        "circuit": "closed",
+    }
+    assert merged["currencies"]["latency_mean"] >= 0.25
@@ -1,9 +1,15 @@
+import io
 import json
-from unittest.mock import mock_open, patch
+import os
+from unittest.mock import patch
 
+import pandas as pd
 import pytest
 
-from src.reports import spending_by_category, write_to_file
+from src.reports import (get_spending_by_categories, get_spending_by_category, get_spending_totals_by_category,
+                         get_unique_names, iter_spending_by_category, open_report_file, spending_by_category,
+                         spending_totals_by_category, write_report, write_reports_by_category, write_to_file)
+from src.utils import DERIVED_COLUMNS, apply_schema, build_operations_index, build_totals_index, sort_by_date
 
 
 def test_spending_by_category(get_df, dec_df):
@@ -13,6 +19,37 @@ def test_spending_by_category(get_df, dec_df):
     )
 
 
+def test_spending_by_category_keeps_source_df(get_df):
+    """Тестирует, что функция не изменяет переданный датафрейм."""
+    columns = list(get_df.columns)
+    spending_by_category(get_df, "Фастфуд", "01.12.2021 12:35:05")
+    assert list(get_df.columns) == columns
+
+
+def test_spending_by_category_typed_df(get_df):
+    """Тестирует работу функции с датафреймом, приведенным к типам схемы."""
+    result = json.loads(spending_by_category(apply_schema(get_df), "Ж/д билеты", "01.02.2018 00:00:00"))
+    assert result == [
+        {
+            "Дата операции": "31.01.2018 20:09:33",
+            "Дата платежа": "31.01.2018",
+            "Номер карты": "*4556",
+            "Статус": "OK",
+            "Сумма операции": -1212.8,
+            "Валюта операции": "RUB",
+            "Сумма платежа": -1212.8,
+            "Валюта платежа": "RUB",
+            "Кэшбэк": 12.0,
+            "Категория": "Ж/д билеты",
+            "MCC": 4112,
+            "Описание": "РЖД",
+            "Бонусы (включая кэшбэк)": 12.0,
+            "Округление на инвесткопилку": 0.0,
+            "Сумма операции с округлением": 1212.8,
+        }
+    ]
+
+
 @pytest.mark.parametrize("date", ["01.12.2021", "01-12-2021 12:35:05", "2021-12-01 12:35:05", "2021-12-01"])
 def test_spending_by_category_wrong_date(get_df, date, capsys):
     """Тестирует работу функции при передаче неверного формата даты."""
@@ -42,53 +79,250 @@ def test_spending_by_category_no_transactions(get_df):
     assert spending_by_category(get_df, "Not existing category", "01.12.2021 12:35:05") == "[]"
 
 
-@patch("builtins.open", new_callable=mock_open)
-@patch("os.path.dirname", return_value="/mock/path")
-@patch("os.path.join", side_effect=lambda *args: "/".join(args))
-@patch("src.reports.json.dump")
-def test_write_to_file_json(mock_json, mock_join, mock_dirname, mock_opened):
-    """Тестирует запись данных в JSON-файл."""
+@pytest.mark.parametrize("file_name", [None, "report.jsonl", "report.csv", "report.xlsx", "report.csv.gz"])
+def test_write_to_file_string(get_df, file_name, tmp_path):
+    """Тестирует запись отчета, сериализованного в JSON, через потоковые функции записи."""
+    (tmp_path / "data").mkdir()
+    with patch("src.reports.os.path.dirname", return_value=str(tmp_path)):
+        write_to_file(file_name)(spending_by_category)(get_df, "Фастфуд", "01.12.2021 12:35:05")
+
+    file_path = tmp_path / "data" / (file_name or "report.json")
+    if file_name is None:
+        assert file_path.read_text(encoding="utf-8") == spending_by_category(get_df, "Фастфуд", "01.12.2021 12:35:05")
+        result = json.loads(file_path.read_text(encoding="utf-8"))
+    elif file_name.endswith(".jsonl"):
+        result = [json.loads(line) for line in file_path.read_text(encoding="utf-8").splitlines()]
+    elif file_name.endswith(".xlsx"):
+        result = pd.read_excel(file_path).to_dict(orient="records")
+    else:
+        result = pd.read_csv(file_path).to_dict(orient="records")
+    assert [(row["Описание"], row["MCC"], row["Сумма платежа"]) for row in result] == [
+        ("IP Yakubovskaya M.V.", 5814, -99.0)
+    ]
+
 
-    @write_to_file("report.json")
-    def sample_function():
-        return json.dumps({"key": "value"})
+@pytest.mark.parametrize(
+    "report, expected",
+    [
+        ({"key": "value"}, [{"key": "value"}]),
+        (
+            {"key1": ["value1", "value2"], "key2": ["value3", "value4"]},
+            [
+                {"key1": "value1", "key2": "value3"},
+                {"key1": "value2", "key2": "value4"},
+            ],
+        ),
+    ],
+)
+def test_write_to_file_string_dict(report, expected, tmp_path):
+    """Тестирует запись отчета-словаря, сериализованного в JSON."""
+    (tmp_path / "data").mkdir()
+    with patch("src.reports.os.path.dirname", return_value=str(tmp_path)):
+        write_to_file("report.csv")(json.dumps)(report)
+    assert pd.read_csv(tmp_path / "data" / "report.csv").to_dict(orient="records") == expected
 
-    sample_function()
 
-    mock_json.assert_called_once_with(
-        {"key": "value"},
-        mock_opened("/mock/path/data/report.json", "w", encoding="utf-8"),
-        ensure_ascii=False,
-        indent=4,
+def test_get_spending_by_category(get_df, dec_df):
+    """Тестирует получение отчета в виде датафрейма."""
+    result = get_spending_by_category(apply_schema(get_df), "Фастфуд", "01.12.2021 12:35:05")
+    assert list(result.columns) == list(get_df.columns)
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True).astype(object), dec_df.astype(object), check_dtype=False
     )
-    mock_opened.assert_called_with("/mock/path/data/report.json", "w", encoding="utf-8")
+    assert get_spending_by_category(get_df, "Фастфуд", "01.12.2021") is None
+
+
+@pytest.mark.parametrize("category", ["Фастфуд", "Ж/д билеты", "Not existing category"])
+def test_get_spending_by_category_index(get_df, category):
+    """Тестирует, что отчет по индексу совпадает с отчетом по полному просмотру данных."""
+    df = sort_by_date(apply_schema(get_df))
+    pd.testing.assert_frame_equal(
+        get_spending_by_category(df, category, "01.12.2021 12:35:05", build_operations_index(df)),
+        get_spending_by_category(df, category, "01.12.2021 12:35:05"),
+    )
+
+
+@pytest.mark.parametrize("file_name", [None, "report.csv", "report.xlsx"])
+def test_write_to_file_dataframe(get_df, file_name, tmp_path):
+    """Тестирует запись отчета-датафрейма без промежуточной сериализации в JSON."""
+    (tmp_path / "data").mkdir()
+    with patch("src.reports.os.path.dirname", return_value=str(tmp_path)), patch("src.reports.json.loads") as loads:
+        write_to_file(file_name)(get_spending_by_category)(apply_schema(get_df), "Фастфуд", "01.12.2021 12:35:05")
+    loads.assert_not_called()
 
+    file_path = tmp_path / "data" / (file_name or "report.json")
+    if file_name is None:
+        result = json.loads(file_path.read_text(encoding="utf-8"))
+    elif file_name.endswith(".csv"):
+        result = pd.read_csv(file_path).to_dict(orient="records")
+    else:
+        result = pd.read_excel(file_path).to_dict(orient="records")
+    assert [(row["Описание"], row["MCC"], row["Сумма платежа"]) for row in result] == [
+        ("IP Yakubovskaya M.V.", 5814, -99.0)
+    ]
 
-@patch("os.path.dirname", return_value="/mock/path")
-@patch("os.path.join", side_effect=lambda *args: "/".join(args))
-@patch("pandas.DataFrame.to_csv")
-def test_write_to_file_csv(mock_to_csv, mock_join, mock_dirname):
-    """Тестирует запись данных в CSV-файл."""
 
-    @write_to_file("report.csv")
-    def sample_function():
-        return json.dumps({"key1": ["value1", "value2"], "key2": ["value3", "value4"]})
+@patch("src.reports.open")
+def test_write_to_file_no_result(mock_opened, get_df, caplog):
+    """Тестирует, что при ошибке формирования отчета файл не записывается."""
+    write_to_file()(get_spending_by_category)(get_df, "Фастфуд", "01.12.2021")
+    mock_opened.assert_not_called()
+    assert "Nothing to write. Report was not generated" in caplog.messages
 
-    sample_function()
 
-    mock_to_csv.assert_called_once_with("/mock/path/data/report.csv", index=False)
+@pytest.mark.parametrize("file_name", ["report.json", "report.jsonl", "report.csv", "report.json.gz", "report.csv.gz"])
+def test_write_report(get_df, file_name, tmp_path):
+    """Тестирует потоковую запись отчета по частям в текстовых форматах."""
+    df = apply_schema(get_df)
+    file_path = str(tmp_path / file_name)
+    assert write_report(iter_spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05", chunk_size=1), file_path) == 1
 
+    with open_report_file(file_path, "r") as report_file:
+        content = report_file.read()
+    expected = spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05")
+    if file_name.removesuffix(".gz").endswith(".json"):
+        assert content == expected
+    elif file_name.endswith(".jsonl"):
+        assert [json.loads(line) for line in content.splitlines()] == json.loads(expected)
+    else:
+        assert pd.read_csv(io.StringIO(content))["Описание"].tolist() == ["IP Yakubovskaya M.V."]
 
-@patch("os.path.dirname", return_value="/mock/path")
-@patch("os.path.join", side_effect=lambda *args: "/".join(args))
-@patch("pandas.DataFrame.to_excel")
-def test_write_to_file_excel(mock_to_excel, mock_join, mock_dirname):
-    """Тестирует запись данных в XLSX-файл."""
 
-    @write_to_file("report.xlsx")
-    def sample_function():
-        return json.dumps({"key1": ["value1", "value2"], "key2": ["value3", "value4"]})
+@pytest.mark.parametrize("sort", [False, True])
+def test_iter_spending_by_category(get_df, sort):
+    """Тестирует, что ленивый обход по частям совпадает с отчетом, полученным целиком."""
+    df = apply_schema(get_df.assign(**{"Категория": ["Фастфуд", "Фастфуд", "Фастфуд"]}))
+    df = sort_by_date(df) if sort else df
+    chunks = list(iter_spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05", chunk_size=1))
+    assert all(len(chunk) <= 1 for chunk in chunks)
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks), get_spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05"), check_categorical=False
+    )
+    assert iter_spending_by_category(df, "Фастфуд", "01.12.2021") is None
+
+
+def test_spending_by_category_newest_first(get_df):
+    """Тестирует, что отчеты по отсортированным при загрузке данным выводят операции от новых к старым."""
+    df = sort_by_date(apply_schema(get_df.assign(**{"Категория": ["Фастфуд", "Фастфуд", "Фастфуд"]})))
+    expected = ["01.12.2021 12:35:05", "30.11.2021 18:19:28"]
+    report = json.loads(spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05"))
+    assert [row["Дата операции"] for row in report] == expected
+    chunks = iter_spending_by_category(df, "Фастфуд", "01.12.2021 12:35:05", chunk_size=1)
+    assert pd.concat(chunks)["Дата операции"].tolist() == expected
+    reports = get_spending_by_categories(df, "01.12.2021 12:35:05")
+    assert reports["Фастфуд"]["Дата операции"].tolist() == expected
+
+
+def test_write_report_xlsx(get_df, tmp_path):
+    """Тестирует потоковую запись отчета в XLSX-файл."""
+    file_path = str(tmp_path / "report.xlsx")
+    assert (
+        write_report(iter_spending_by_category(apply_schema(get_df), "Ж/д билеты", None, chunk_size=2), file_path) == 0
+    )
+    assert write_report(apply_schema(get_df).drop(columns=DERIVED_COLUMNS), file_path) == 3
+    result = pd.read_excel(file_path)
+    assert list(result.columns) == list(get_df.columns)
+    assert result["Описание"].tolist() == ["IP Yakubovskaya M.V.", "Перевод на карту", "РЖД"]
+
+
+@pytest.mark.parametrize("file_name", ["report.json", "report.jsonl", "report.csv"])
+def test_write_report_no_rows(get_df, file_name, tmp_path):
+    """Тестирует запись отчета, когда операций не найдено."""
+    file_path = str(tmp_path / file_name)
+    assert (
+        write_report(iter_spending_by_category(get_df, "Not existing category", "01.12.2021 12:35:05"), file_path) == 0
+    )
+    with open(file_path, encoding="utf-8") as report_file:
+        content = report_file.read()
+    assert (
+        content == {"report.json": "[]", "report.jsonl": "", "report.csv": ",".join(get_df.columns) + "\n"}[file_name]
+    )
 
-    sample_function()
 
-    mock_to_excel.assert_called_once_with("/mock/path/data/report.xlsx", index=False)
+def test_get_spending_by_categories(get_df):
+    """Тестирует получение отчетов сразу по всем категориям."""
+    df = apply_schema(get_df)
+    reports = get_spending_by_categories(df, "31.01.2018 23:00:00")
+    assert list(reports) == ["Ж/д билеты"]
+    pd.testing.assert_frame_equal(
+        reports["Ж/д билеты"], get_spending_by_category(df, "Ж/д билеты", "31.01.2018 23:00:00")
+    )
+
+    reports = get_spending_by_categories(df, "01.12.2021 12:35:05", categories=["Фастфуд", "Not existing category"])
+    assert list(reports) == ["Фастфуд"]
+    assert get_spending_by_categories(df, "01.12.2021") is None
+
+
+@pytest.mark.parametrize("use_totals", [True, False])
+def test_spending_totals_by_category(get_df, use_totals):
+    """Тестирует подсчет итогов по категориям за 3 месяца до даты."""
+    df = sort_by_date(apply_schema(get_df))
+    totals = build_totals_index(df) if use_totals else None
+    assert get_spending_totals_by_category(df, "31.12.2021 16:44:00", totals) == {
+        "Фастфуд": {"amount": -99.0, "cashback": 0.0, "count": 1}
+    }
+    assert json.loads(spending_totals_by_category(df, "31.01.2018 23:00:00", totals)) == {
+        "Ж/д билеты": {"amount": -1212.8, "cashback": 12.0, "count": 1}
+    }
+    assert spending_totals_by_category(df, "31.12.2021", totals) is None
+
+
+def test_write_reports_by_category(get_df, tmp_path):
+    """Тестирует выгрузку отчетов по всем категориям в отдельные файлы."""
+    df = apply_schema(get_df)
+    file_names = write_reports_by_category(df, "01.12.2021 12:35:05", "csv", output_dir=str(tmp_path))
+    assert [os.path.basename(file_name) for file_name in file_names] == ["report_Фастфуд.csv"]
+    assert pd.read_csv(tmp_path / "report_Фастфуд.csv")["Описание"].tolist() == ["IP Yakubovskaya M.V."]
+
+
+def test_write_reports_by_category_same_safe_name(get_df, tmp_path):
+    """Тестирует, что категории с одинаковым безопасным именем не перезаписывают файлы друг друга."""
+    df = get_df.assign(
+        **{
+            "Дата операции": ["01.12.2021 12:35:05", "30.11.2021 18:19:28", "30.11.2021 10:00:00"],
+            "Категория": ["A/B", "A:B", "a-b"],
+        }
+    )
+    file_names = write_reports_by_category(
+        sort_by_date(apply_schema(df)), "01.12.2021 12:35:05", "csv", output_dir=str(tmp_path)
+    )
+    assert [os.path.basename(file_name) for file_name in file_names] == [
+        "report_A-B.csv",
+        "report_A-B (2).csv",
+        "report_a-b (3).csv",
+    ]
+    assert sorted(pd.read_csv(file_name)["Описание"][0] for file_name in file_names) == sorted(df["Описание"])
+
+    file_names = write_reports_by_category(
+        sort_by_date(apply_schema(df)), "01.12.2021 12:35:05", workbook=True, output_dir=str(tmp_path)
+    )
+    assert list(pd.read_excel(file_names[0], sheet_name=None)) == ["A-B", "A-B (2)", "a-b (3)"]
+
+
+@pytest.mark.parametrize(
+    "names, max_length, expected",
+    [
+        (["A/B", "A:B", "C"], 100, {"A/B": "A-B", "A:B": "A-B (2)", "C": "C"}),
+        (["Ab", "aB", "AB"], 100, {"Ab": "Ab", "aB": "aB (2)", "AB": "AB (3)"}),
+        (["abcdef/", "abcdef:"], 6, {"abcdef/": "abcdef", "abcdef:": "ab (2)"}),
+    ],
+)
+def test_get_unique_names(names, max_length, expected):
+    """Тестирует нумерацию повторяющихся безопасных имен с учетом ограничения длины."""
+    assert get_unique_names(names, max_length) == expected
+
+
+def test_write_reports_by_category_workbook(get_df, tmp_path):
+    """Тестирует выгрузку отчетов по всем категориям в одну XLSX-книгу с листом на категорию."""
+    df = get_df.assign(
+        **{
+            "Дата операции": ["01.12.2021 12:35:05", "30.11.2021 18:19:28", "30.11.2021 10:00:00"],
+            "Категория": ["Фастфуд", "Переводы", "Ж/д билеты"],
+        }
+    )
+    file_names = write_reports_by_category(
+        sort_by_date(apply_schema(df)), "01.12.2021 12:35:05", workbook=True, output_dir=str(tmp_path)
+    )
+    sheets = pd.read_excel(file_names[0], sheet_name=None)
+    assert list(sheets) == ["Ж-д билеты", "Переводы", "Фастфуд"]
+    assert sheets["Ж-д билеты"]["Описание"].tolist() == ["РЖД"]
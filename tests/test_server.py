@@ -0,0 +1,195 @@
+import gc
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from contextlib import suppress
+from unittest.mock import ANY, patch
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+import pytest
+
+from src import http_client
+from src.server import create_server, get_http_stats, run_server, run_worker
+
+
+@pytest.fixture
+def base_url(get_df):
+    server = create_server(get_df, port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def get_json(url: str) -> tuple[int, dict | list]:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+@patch("src.server.generate_json_response", return_value='{"greeting": "Добрый день"}')
+def test_home(mock_generate_json_response, base_url, get_df):
+    """Тестирует эндпоинт страницы Главная."""
+    assert get_json(f"{base_url}/home?date=2021-12-01%2015:45:00") == (200, {"greeting": "Добрый день"})
+    mock_generate_json_response.assert_called_once_with("2021-12-01 15:45:00", get_df, ANY)
+
+
+def test_home_wrong_date(base_url):
+    """Тестирует эндпоинт страницы Главная при передаче неверной даты."""
+    status, result = get_json(f"{base_url}/home?date=01.12.2021")
+    assert status == 400
+    assert result == {"error": "Неправильный формат даты. Введите дату в формате YYYY-MM-DD HH:MM:SS"}
+
+
+@patch("src.server.generate_json_response", side_effect=json.JSONDecodeError("Expecting value", "", 0))
+def test_home_no_settings(mock_generate_json_response, base_url):
+    """Тестирует эндпоинт страницы Главная, когда настройки пользователя не заданы."""
+    assert get_json(f"{base_url}/home")[0] == 503
+
+
+@patch("src.server.generate_json_response", side_effect=KeyError("date"))
+def test_internal_error(mock_generate_json_response, base_url):
+    """Тестирует ответ на запрос, при обработке которого произошла ошибка."""
+    assert get_json(f"{base_url}/home") == (500, {"error": "Internal server error"})
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("month=2021-12&limit=50", (200, {"month": "2021-12", "investment_amount": 1.0})),
+        ("month=2021-12&limit=100", (200, {"month": "2021-12", "investment_amount": 1.0})),
+        ("month=2020-01&limit=10", (200, {"month": "2020-01", "investment_amount": 0.0})),
+        ("month=12.2021&limit=10", (400, {"error": "Неправильный формат даты. Введите дату в формате YYYY-MM"})),
+        (
+            "month=2021-12&limit=20",
+            (400, {"error": "Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100"}),
+        ),
+    ],
+)
+def test_investment(base_url, query, expected):
+    """Тестирует эндпоинт «Инвесткопилки»."""
+    assert get_json(f"{base_url}/investment?{query}") == expected
+
+
+def test_category_report(base_url):
+    """Тестирует эндпоинт отчета по тратам определенной категории."""
+    status, result = get_json(f"{base_url}/reports/category?category={quote('Фастфуд')}&date=31.12.2021%2016:44:00")
+    assert status == 200
+    assert [transaction["Описание"] for transaction in result] == ["IP Yakubovskaya M.V."]
+    assert result[0]["Кэшбэк"] is None
+    assert get_json(f"{base_url}/reports/category")[0] == 400
+    assert get_json(f"{base_url}/reports/category?category={quote('Фастфуд')}&date=2021-12-31")[0] == 400
+
+
+def test_category_totals(base_url):
+    """Тестирует эндпоинт итогов по категориям."""
+    assert get_json(f"{base_url}/reports/totals?date=31.12.2021%2016:44:00") == (
+        200,
+        {"Фастфуд": {"amount": -99.0, "cashback": 0.0, "count": 1}},
+    )
+    assert get_json(f"{base_url}/reports/totals?date=2021-12-31")[0] == 400
+
+
+def test_search(base_url):
+    """Тестирует эндпоинт поиска операций по словам описания."""
+    status, result = get_json(f"{base_url}/search?q={quote('ржд')}&card=4556")
+    assert status == 200
+    assert [(operation["description"], operation["card"]) for operation in result] == [("РЖД", "4556")]
+    assert get_json(f"{base_url}/search?q={quote('ржд')}&start=2021-01-01") == (200, [])
+    assert get_json(f"{base_url}/search")[0] == 400
+    assert get_json(f"{base_url}/search?q=ip&start=01.01.2021")[0] == 400
+    assert get_json(f"{base_url}/search?q=ip&limit=-1")[0] == 400
+
+
+def test_unknown_endpoint(base_url):
+    """Тестирует ответ на запрос к несуществующему эндпоинту."""
+    assert get_json(f"{base_url}/unknown") == (404, {"error": "Unknown endpoint /unknown"})
+
+
+def test_concurrent_requests(base_url):
+    """Тестирует одновременную обработку запросов."""
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_json(f"{base_url}/investment?month=2021-12&limit=50")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(200, {"month": "2021-12", "investment_amount": 1.0})] * 8
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+@pytest.mark.parametrize("workers, stop_signal", [(1, signal.SIGINT), (2, signal.SIGTERM)])
+def test_run_server(get_df, tmp_path, monkeypatch, workers, stop_signal):
+    """Тестирует запуск сервера (в двух процессах - с освобождением общих ресурсов при повторном SIGTERM)."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        port = free_socket.getsockname()[1]
+    shared_memory = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    results = []
+
+    def request_and_stop() -> None:
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            with suppress(OSError):
+                results.append(get_json(f"{base_url}/search?q={quote('ржд')}"))
+                results.append(get_json(f"{base_url}/stats"))
+                break
+            time.sleep(0.1)
+        os.kill(os.getpid(), stop_signal)
+        if workers > 1:
+            time.sleep(0.1)
+            os.kill(os.getpid(), stop_signal)
+
+    client = threading.Thread(target=request_and_stop)
+    client.start()
+    try:
+        run_server(file_path, port=port, workers=workers)
+    finally:
+        client.join()
+        gc.unfreeze()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    assert results[0][0] == 200
+    assert [operation["description"] for operation in results[0][1]] == ["РЖД"]
+    assert results[1] == (200, {})
+    assert not list(tmp_path.glob("skybank-stats-*"))
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= shared_memory
+
+
+@patch("src.server.os._exit", side_effect=SystemExit)
+def test_run_worker(mock_exit, get_df, tmp_path, monkeypatch):
+    """Тестирует, что процесс-обработчик пишет счетчики в свой файл и завершается без очистки интерпретатора."""
+    server = create_server(get_df, port=0)
+    server.stats_dir = str(tmp_path)
+    monkeypatch.setattr("src.http_client.stats_path", None)
+    with patch.object(server, "serve_forever", side_effect=KeyboardInterrupt), pytest.raises(SystemExit):
+        run_worker(server)
+    server.server_close()
+    assert http_client.stats_path == str(tmp_path / f"{os.getpid()}.json")
+    mock_exit.assert_called_once_with(0)
+    assert get_http_stats(server, {}) == (200, "{}")
+
+
+@patch("src.server.get_data_from_xlsx", return_value=None)
+def test_run_server_no_data(mock_get_data, capsys):
+    """Тестирует, что сервер не запускается, если операции не удалось загрузить."""
+    run_server("operations.xlsx")
+    assert capsys.readouterr().out.endswith("Не удалось загрузить операции\n")
@@ -1,8 +1,14 @@
 import json
+from datetime import datetime
 
+import numpy as np
 import pytest
 
-from src.services import filter_by_month, get_transactions_list, investment_bank, round_to_limit
+from src.services import (INVESTMENT_LIMITS, build_search_index, filter_by_month, get_investment_table,
+                          get_operations_by_month, get_round_up_columns, get_round_ups, get_transactions_list,
+                          investment_bank, investment_bank_by_chunks, investment_bank_by_table,
+                          investment_bank_by_totals, round_to_limit, search_operations, tokenize, update_search_index)
+from src.utils import apply_schema, build_totals_index, sort_by_date
 
 
 def test_get_transactions_list(get_df):
@@ -13,11 +19,34 @@ def test_get_transactions_list(get_df):
     ]
 
 
+def test_get_transactions_list_malformed_date(get_df):
+    """Тестирует работу функции, когда у части транзакций некорректная дата."""
+    get_df.loc[0, "Дата операции"] = "01.12.2021"
+    assert get_transactions_list(get_df) == [
+        {"Дата операции": "2021-11-30", "Сумма операции": -55.00},
+        {"Дата операции": "2018-01-31", "Сумма операции": -1212.80},
+    ]
+
+
 def test_get_transactions_list_empty_df(get_empty_df):
     """Тестирует работу функции при пустом датафрейме."""
     assert get_transactions_list(get_empty_df) == []
 
 
+@pytest.mark.parametrize("month, expected", [("2021-11", ["Перевод на карту"]), ("2018-01", ["РЖД"]), ("2020-01", [])])
+def test_get_operations_by_month(get_df, month, expected):
+    """Тестирует получение операций за месяц из датафрейма."""
+    df = sort_by_date(apply_schema(get_df))
+    assert get_operations_by_month(month, df)["Описание"].tolist() == expected
+
+
+def test_get_operations_by_month_wrong_date(get_df, capsys):
+    """Тестирует получение операций за месяц при неправильном формате месяца."""
+    assert get_operations_by_month("2021.11", get_df).empty
+    captured = capsys.readouterr()
+    assert captured.out == "Неправильный формат даты. Введите дату в формате YYYY-MM\n"
+
+
 def test_filter_by_month(transactions_list):
     """Тестирует нормальную работу функции."""
     assert filter_by_month("2021-12", transactions_list) == transactions_list[:2]
@@ -102,3 +131,194 @@ def test_investment_bank_wrong_limit(transactions_list, capsys):
     )
     captured = capsys.readouterr()
     assert "Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100\n" in captured.out
+
+
+@pytest.mark.parametrize(
+    "month, limit, expected",
+    [
+        ("2021-12", 10, 1.0),
+        ("2021-11", 50, 45.0),
+        ("2018-01", 100, 87.2),
+    ],
+)
+def test_investment_bank_by_chunks(month, limit, expected, get_df):
+    """Тестирует работу функции при потоковом чтении данных."""
+    chunks = [get_df.iloc[:2], get_df.iloc[2:]]
+    assert investment_bank_by_chunks(month, chunks, limit) == json.dumps(
+        {"month": month, "investment_amount": expected}
+    )
+
+
+def test_investment_bank_by_chunks_no_transactions(get_df):
+    """Тестирует работу функции при потоковом чтении данных, когда транзакции не найдены."""
+    assert investment_bank_by_chunks("2021-10", [get_df.iloc[:2], get_df.iloc[2:]], 10) is None
+
+
+def test_investment_bank_by_chunks_wrong_date(get_df, capsys):
+    """Тестирует работу функции при потоковом чтении данных и неправильном формате месяца."""
+    assert investment_bank_by_chunks("2021.12", [get_df], 10) is None
+    captured = capsys.readouterr()
+    assert captured.out == "Неправильный формат даты. Введите дату в формате YYYY-MM\n"
+
+
+def test_get_round_ups():
+    """Тестирует векторное округление сумм до каждого из лимитов."""
+    amounts = [-160.89, -64.0, -103.0, 500.0, np.nan]
+    expected = [[round_to_limit(amount, limit) for limit in [10, 50, 100]] for amount in amounts[:-1]]
+    assert get_round_ups(np.array(amounts), [10, 50, 100]).tolist() == expected + [[0.0, 0.0, 0.0]]
+
+
+def test_get_investment_table(get_df):
+    """Тестирует подсчет сумм для «Инвесткопилки» по всем месяцам и лимитам."""
+    table = get_investment_table(apply_schema(get_df))
+    assert table.index.tolist() == ["2018-01", "2021-11", "2021-12"]
+    assert table.columns.tolist() == [10, 50, 100]
+    assert table.loc["2018-01"].tolist() == [7.2, 37.2, 87.2]
+    assert table.loc["2021-11"].tolist() == [5.0, 45.0, 45.0]
+    assert table.loc["2021-12"].tolist() == [1.0, 1.0, 1.0]
+
+
+def test_get_investment_table_empty_df(get_empty_df):
+    """Тестирует подсчет сумм для «Инвесткопилки» при отсутствии данных."""
+    assert get_investment_table(get_empty_df).empty
+
+
+@pytest.mark.parametrize(
+    "month, limit, expected",
+    [
+        ("2021-11", 50, json.dumps({"month": "2021-11", "investment_amount": 45.0})),
+        ("2018-01", 10, json.dumps({"month": "2018-01", "investment_amount": 7.2})),
+        ("2021-10", 10, None),
+    ],
+)
+def test_investment_bank_by_table(get_df, month, limit, expected):
+    """Тестирует получение суммы для «Инвесткопилки» по таблице месяц × лимит."""
+    assert investment_bank_by_table(month, get_investment_table(get_df), limit) == expected
+
+
+@pytest.mark.parametrize("month", ["2021-11", "2021-12", "2018-01", "2021-10"])
+@pytest.mark.parametrize("limit", INVESTMENT_LIMITS)
+def test_investment_bank_by_totals(get_df, month, limit):
+    """Тестирует совпадение суммы для «Инвесткопилки» по накопленным суммам и по таблице месяц × лимит."""
+    df = apply_schema(get_df)
+    totals = build_totals_index(df, get_round_up_columns(df))
+    assert investment_bank_by_totals(month, totals, limit) == investment_bank_by_table(
+        month, get_investment_table(df), limit
+    )
+
+
+def test_investment_bank_by_totals_wrong_data(get_df, capsys):
+    """Тестирует работу функции по накопленным суммам при неправильном месяце или лимите."""
+    df = apply_schema(get_df)
+    totals = build_totals_index(df, get_round_up_columns(df))
+    assert investment_bank_by_totals("11-2021", totals, 10) is None
+    assert investment_bank_by_totals("2021-11", totals, 25) == json.dumps(
+        {"month": "2021-11", "investment_amount": 0.0}
+    )
+    captured = capsys.readouterr()
+    assert captured.out == (
+        "Неправильный формат даты. Введите дату в формате YYYY-MM\n"
+        "Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100\n"
+    )
+
+
+def test_investment_bank_by_table_wrong_data(get_df, capsys):
+    """Тестирует работу функции при неправильном месяце или лимите."""
+    table = get_investment_table(get_df)
+    assert investment_bank_by_table("11-2021", table, 10) is None
+    assert investment_bank_by_table("2021-11", table, 25) == json.dumps({"month": "2021-11", "investment_amount": 0.0})
+    captured = capsys.readouterr()
+    assert captured.out == (
+        "Неправильный формат даты. Введите дату в формате YYYY-MM\n"
+        "Указан неверный лимит. Выберите лимит из возможных вариантов: 10, 50, 100\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Перевод на карту", ["перевод", "на", "карту"]),
+        ("IP Yakubovskaya M.V.", ["ip", "yakubovskaya", "m", "v"]),
+        ("ПЯТЁРОЧКА-123", ["пятерочка", "123"]),
+        (np.nan, []),
+    ],
+)
+def test_tokenize(text, expected):
+    """Тестирует разбиение текста на слова."""
+    assert tokenize(text) == expected
+
+
+@pytest.fixture
+def search_df(get_df):
+    df = get_df.assign(
+        **{
+            "Описание": ["Пятёрочка", "Перевод на карту", "Перевод с карты"],
+            "Дата операции": ["01.12.2021 12:35:05", "30.11.2021 18:19:28", "29.11.2021 10:00:00"],
+        }
+    )
+    return sort_by_date(apply_schema(df))
+
+
+@pytest.mark.parametrize(
+    "query, card, expected",
+    [
+        ("перевод", None, [("Перевод на карту", 2.0), ("Перевод с карты", 2.0)]),
+        ("ПЕРЕВОД КАРТУ", None, [("Перевод на карту", 4.0)]),
+        ("перев карт", None, [("Перевод на карту", 2.0), ("Перевод с карты", 2.0)]),
+        ("пятерочка", None, [("Пятёрочка", 2.0)]),
+        ("перевод", "7197", []),
+        ("перевод", ["4556"], [("Перевод на карту", 2.0), ("Перевод с карты", 2.0)]),
+        ("ржд", None, []),
+        ("", None, []),
+    ],
+)
+def test_search_operations(search_df, query, card, expected):
+    """Тестирует поиск операций по словам описания."""
+    result = search_operations(search_df, build_search_index(search_df), query, card)
+    assert [(operation["description"], operation["score"]) for operation in result] == expected
+
+
+def test_search_operations_period_and_limit(search_df):
+    """Тестирует поиск операций в периоде и ограничение числа результатов."""
+    search_index = build_search_index(search_df)
+    result = search_operations(search_df, search_index, "карт", start_date=datetime(2021, 11, 30))
+    assert result == [
+        {
+            "date": "30.11.2021 18:19:28",
+            "amount": -55.0,
+            "card": "4556",
+            "category": None,
+            "description": "Перевод на карту",
+            "score": 1.0,
+        }
+    ]
+    assert len(search_operations(search_df, search_index, "перевод", limit=1)) == 1
+
+
+def test_search_operations_missing_values(search_df):
+    """Тестирует, что пропущенные карта, сумма и категория возвращаются как None, а не NaN."""
+    df = search_df.copy()
+    df.loc[df["Описание"] == "Пятёрочка", ["Номер карты", "card", "Сумма операции", "Категория"]] = np.nan
+    result = search_operations(df, build_search_index(df), "пятерочка")
+    assert result == [
+        {
+            "date": "01.12.2021 12:35:05",
+            "amount": None,
+            "card": None,
+            "category": None,
+            "description": "Пятёрочка",
+            "score": 2.0,
+        }
+    ]
+    assert json.loads(json.dumps(result, allow_nan=False)) == result
+
+
+def test_update_search_index(search_df):
+    """Тестирует дополнение поискового индекса добавленными строками."""
+    loaded = search_df.iloc[:2].reset_index(drop=True)
+    loaded.attrs["sorted_by_date"] = True
+    search_index = update_search_index(build_search_index(loaded), search_df)
+    assert [operation["description"] for operation in search_operations(search_df, search_index, "пят")] == [
+        "Пятёрочка"
+    ]
+    assert len(search_operations(search_df, search_index, "перевод")) == 2
@@ -1,24 +1,486 @@
+import multiprocessing
+import os
 import tempfile
+from datetime import datetime
 from unittest import mock
 from unittest.mock import patch
 
+import numpy as np
+import pandas as pd
 import pytest
 import requests
 
-from src.utils import (calculate_cashback, filter_by_date, get_currencies, get_data_from_user, get_data_from_xlsx,
-                       get_data_via_api_currencies, get_data_via_api_stocks, get_exchange_rates, get_stock_prices,
-                       get_stocks, get_top_five_transactions, get_total_expenses, process_cards_info, say_hello,
-                       sort_by_amount)
+from src import utils
+from src.utils import (StocksIndex, aggregate_operations, append_operations, apply_schema, attach_operations,
+                       build_operations_index, build_totals_index, calculate_cashback, concat_operations,
+                       count_operations_until, filter_by_date, filter_chunks_by_date, get_cache_paths,
+                       get_cards_summary, get_cards_summary_by_totals, get_currencies, get_data_fingerprint,
+                       get_data_from_user, get_data_from_xlsx, get_data_via_api_currencies, get_data_via_api_stocks,
+                       get_exchange_rates, get_indexed_operations, get_operations_by_period, get_stock_prices,
+                       get_stocks, get_top_five_transactions, get_top_transactions, get_top_transactions_by_chunks,
+                       get_total_expenses, get_total_expenses_by_chunks, get_window_total, get_window_totals,
+                       is_sorted_by_date, parse_dates, plan_query, process_cards_info, query_operations,
+                       read_json_cache, read_xlsx_by_chunks, release_operations, say_hello, share_operations,
+                       sort_by_amount, sort_by_date)
 
 
 @patch("src.utils.pd.read_excel")
 def test_get_data_from_xlsx(mock_read_excel, get_df):
     """Тестирует нормальную работу функции."""
     mock_read_excel.return_value = get_df
-    assert get_data_from_xlsx("existing.xlsx").equals(get_df)
+    assert get_data_from_xlsx("existing.xlsx").equals(sort_by_date(apply_schema(get_df)))
     mock_read_excel.assert_called_once_with("existing.xlsx")
 
 
+def test_apply_schema(get_df, caplog):
+    """Тестирует приведение колонок к компактным типам данных."""
+    df = apply_schema(get_df)
+
+    assert df["Категория"].dtype == "category"
+    assert df["Описание"].dtype == "category"
+    assert df["MCC"].dtype == "Int64"
+    assert df["Бонусы (включая кэшбэк)"].dtype == df["Округление на инвесткопилку"].dtype == "float64"
+    assert df["MCC"].isna().tolist() == [False, True, False]
+    assert df["card"].tolist() == ["7197", "4556", "4556"]
+    assert df["date"].tolist() == [
+        datetime(2021, 12, 1, 12, 35, 5),
+        datetime(2021, 11, 30, 18, 19, 28),
+        datetime(2018, 1, 31, 20, 9, 33),
+    ]
+    assert df["payment_date"].dtype == "datetime64[ns]"
+    assert get_df["Категория"].dtype == "object"
+    assert any(message.startswith("Memory usage changed") for message in caplog.messages)
+
+
+def test_sort_by_date(get_df):
+    """Тестирует сортировку операций по дате."""
+    get_df.loc[1, "Дата операции"] = np.nan
+    df = sort_by_date(get_df)
+
+    assert df["Описание"].tolist() == ["РЖД", "IP Yakubovskaya M.V.", "Перевод на карту"]
+    assert df.index.tolist() == [0, 1, 2]
+    assert df.attrs["sorted_by_date"]
+    assert not get_df.attrs
+
+
+@pytest.mark.parametrize("prepare_df", [lambda df: df, sort_by_date])
+@pytest.mark.parametrize(
+    "start_date, end_date, expected",
+    [
+        (datetime(2021, 11, 1), datetime(2021, 12, 31), ["Перевод на карту", "IP Yakubovskaya M.V."]),
+        (datetime(2018, 1, 31, 20, 9, 33), datetime(2018, 1, 31, 20, 9, 33), ["РЖД"]),
+        (datetime(2022, 1, 1), datetime(2022, 12, 31), []),
+        (datetime(2021, 12, 31), datetime(2021, 1, 1), []),
+    ],
+)
+def test_get_operations_by_period(get_df, prepare_df, start_date, end_date, expected):
+    """Тестирует получение операций за период для отсортированных и неотсортированных данных."""
+    df = get_operations_by_period(prepare_df(apply_schema(get_df)), start_date, end_date)
+    assert sorted(df["Описание"].tolist()) == sorted(expected)
+
+
+def test_is_sorted_by_date(get_df, caplog):
+    """Тестирует перепроверку флага сортировки, скопированного pandas в переупорядоченный датафрейм."""
+    df = sort_by_date(apply_schema(get_df))
+    assert is_sorted_by_date(df)
+    assert is_sorted_by_date(df.iloc[1:])
+    assert not is_sorted_by_date(apply_schema(get_df))
+
+    shuffled = df.sort_values("Сумма операции")
+    assert shuffled.attrs["sorted_by_date"]
+    assert not is_sorted_by_date(shuffled)
+    assert "Operations are marked as sorted by date, but they are not. Ignoring the flag" in caplog.messages
+    assert get_operations_by_period(shuffled, datetime(2021, 11, 1), datetime(2021, 12, 31))["Описание"].tolist() == [
+        "IP Yakubovskaya M.V.",
+        "Перевод на карту",
+    ]
+
+
+def test_get_operations_by_period_zero_copy(get_df):
+    """Тестирует, что для отсортированных данных возвращается срез без копирования."""
+    df = sort_by_date(apply_schema(get_df))
+    operations = get_operations_by_period(df, datetime(2021, 11, 1), datetime(2021, 12, 31))
+    assert np.shares_memory(operations["Сумма платежа"].to_numpy(), df["Сумма платежа"].to_numpy())
+
+
+def get_shared_total(spec: dict, queue: multiprocessing.Queue) -> None:
+    df, segments = attach_operations(spec)
+    queue.put((get_total_expenses(df), str(df["MCC"].dtype), df["card"].tolist()))
+
+
+def test_share_operations(get_df):
+    """Тестирует публикацию датафрейма в разделяемую память и подключение к нему без копирования."""
+    df = sort_by_date(apply_schema(get_df))
+    segments, spec = share_operations(df)
+    try:
+        shared_df, shared_segments = attach_operations(spec)
+        assert shared_df["Дата операции"].dtype == "category"
+        pd.testing.assert_frame_equal(shared_df, df.astype({"Дата операции": "category"}))
+        assert shared_df.attrs == {"sorted_by_date": True}
+        amounts = shared_df["Сумма платежа"].to_numpy()
+        assert any(np.shares_memory(amounts, np.frombuffer(segment.buf, np.uint8)) for segment in shared_segments)
+        assert not amounts.flags.writeable
+
+        queue = multiprocessing.get_context("fork").Queue()
+        process = multiprocessing.get_context("fork").Process(target=get_shared_total, args=(spec, queue))
+        process.start()
+        assert queue.get(timeout=10) == (get_total_expenses(df), "Int64", df["card"].tolist())
+        process.join()
+        del shared_df, amounts
+    finally:
+        release_operations(shared_segments)
+        release_operations(segments, unlink=True)
+
+
+def test_get_data_fingerprint(get_df):
+    """Тестирует, что отпечаток зависит только от содержимого датафрейма."""
+    fingerprint = get_data_fingerprint(get_df)
+    assert get_data_fingerprint(get_df.copy()) == fingerprint
+    assert get_data_fingerprint(get_df.set_axis([10, 20, 30])) == fingerprint
+    assert get_data_fingerprint(get_df.assign(**{"Кешбэк": 1.0})) != fingerprint
+    assert get_data_fingerprint(get_df.iloc[:2]) != fingerprint
+
+
+def test_get_data_fingerprint_once(get_df):
+    """Тестирует подсчет отпечатка один раз для датафрейма и заново для производных датафреймов."""
+    fingerprint = get_data_fingerprint(get_df)
+    with patch("src.utils.pd.util.hash_pandas_object") as mock_hash:
+        assert get_data_fingerprint(get_df) == fingerprint
+        mock_hash.assert_not_called()
+    assert get_data_fingerprint(get_df.sort_values("Сумма операции")) != fingerprint
+
+
+def test_get_data_fingerprint_reused_id(get_df):
+    """Тестирует, что производный датафрейм, получивший id освобожденного, не получает его отпечаток."""
+    fingerprints_count = len(utils.data_fingerprints)
+    for _ in range(200):
+        df = get_df.assign(value=1.0)
+        get_data_fingerprint(df)
+        derived_df = df.assign(value=df["value"] + 1)
+        del df
+        changed_df = derived_df.assign(value=derived_df["value"] * 100)
+        assert get_data_fingerprint(changed_df) == get_data_fingerprint(changed_df.copy())
+        del derived_df, changed_df
+    assert len(utils.data_fingerprints) == fingerprints_count
+
+
+@pytest.mark.parametrize("prepare_df", [lambda df: df, sort_by_date])
+def test_count_operations_until(get_df, prepare_df):
+    """Тестирует подсчет операций не позднее даты."""
+    df = prepare_df(apply_schema(get_df))
+    assert count_operations_until(df, datetime(2021, 11, 30, 18, 19, 28)) == 2
+    assert count_operations_until(df, datetime(2017, 1, 1)) == 0
+
+
+def test_concat_operations(get_df):
+    """Тестирует объединение датафреймов с сохранением категориальных типов колонок."""
+    df = concat_operations([apply_schema(get_df.iloc[:1]), apply_schema(get_df.iloc[1:])])
+
+    assert df["Категория"].dtype == "category"
+    assert df["card"].tolist() == ["7197", "4556", "4556"]
+    assert df["Описание"].tolist() == get_df["Описание"].tolist()
+
+
+def test_build_operations_index(get_df):
+    """Тестирует построение индекса по категории, MCC и номеру карты."""
+    index = build_operations_index(sort_by_date(apply_schema(get_df)))
+    assert index["rows"] == 3
+    assert {
+        column: {value: list(positions) for value, positions in values.items()}
+        for column, values in index["columns"].items()
+    } == {
+        "Категория": {"Ж/д билеты": [0], "Фастфуд": [2]},
+        "MCC": {4112: [0], 5814: [2]},
+        "card": {"4556": [0, 1], "7197": [2]},
+    }
+
+
+@pytest.mark.parametrize(
+    "filters, start_date, end_date, expected",
+    [
+        ({"card": "4556"}, None, None, ["РЖД", "Перевод на карту"]),
+        ({"card": "4556"}, datetime(2021, 1, 1), None, ["Перевод на карту"]),
+        ({"card": ["4556", "7197"], "MCC": [5814, 4112]}, None, datetime(2021, 12, 1), ["РЖД"]),
+        ({"Категория": "Фастфуд", "card": "4556"}, None, None, []),
+        ({"Категория": "Not existing category"}, None, None, []),
+        ({}, datetime(2021, 11, 30), datetime(2021, 12, 31), ["Перевод на карту", "IP Yakubovskaya M.V."]),
+        ({}, None, None, ["РЖД", "Перевод на карту", "IP Yakubovskaya M.V."]),
+    ],
+)
+def test_get_indexed_operations(get_df, filters, start_date, end_date, expected):
+    """Тестирует выборку операций по индексу и границам дат."""
+    df = sort_by_date(apply_schema(get_df))
+    result = get_indexed_operations(df, build_operations_index(df), filters, start_date, end_date)
+    assert result["Описание"].tolist() == expected
+
+    unsorted_df = apply_schema(get_df)
+    result = get_indexed_operations(unsorted_df, build_operations_index(unsorted_df), filters, start_date, end_date)
+    assert sorted(result["Описание"].tolist()) == sorted(expected)
+
+
+def test_get_indexed_operations_outdated_index(get_df, caplog):
+    """Тестирует перестроение индекса, не соответствующего данным."""
+    df = sort_by_date(apply_schema(get_df))
+    index = build_operations_index(df.iloc[:1])
+    assert get_indexed_operations(df, index, {"card": "4556"})["Описание"].tolist() == ["РЖД", "Перевод на карту"]
+    assert "Index is out of date. Rebuilding it" in caplog.messages
+
+
+@pytest.mark.parametrize("prepare_df", [lambda df: df, sort_by_date])
+@pytest.mark.parametrize("use_index", [True, False])
+@pytest.mark.parametrize(
+    "filters, start_date, amount_range, expected",
+    [
+        ({"Статус": "OK", "Валюта операции": "RUB"}, None, None, ["РЖД", "IP Yakubovskaya M.V."]),
+        ({"card": "4556", "Статус": ["FAILED"]}, None, None, ["Перевод на карту"]),
+        ({"MCC": 5814}, datetime(2021, 12, 1), None, ["IP Yakubovskaya M.V."]),
+        ({}, None, (-100, -50), ["Перевод на карту", "IP Yakubovskaya M.V."]),
+        ({"card": "4556"}, datetime(2021, 1, 1), (None, -60), []),
+        ({"Валюта операции": "USD"}, None, None, []),
+        ({"Not existing column": "value"}, None, None, []),
+    ],
+)
+def test_query_operations(get_df, prepare_df, use_index, filters, start_date, amount_range, expected):
+    """Тестирует выборку операций по фильтрам, датам и диапазону сумм с индексом и без него."""
+    df = prepare_df(apply_schema(get_df))
+    index = build_operations_index(df) if use_index else None
+    result = query_operations(df, filters, start_date, amount_range=amount_range, index=index)
+    assert sorted(result["Описание"].tolist()) == sorted(expected)
+
+
+def test_query_operations_projection(get_df):
+    """Тестирует выборку только нужных колонок и построение номера карты без колонки card."""
+    result = query_operations(get_df, {"card": "4556"}, columns=["Описание", "Сумма операции", "unknown"])
+    assert result.to_dict(orient="list") == {
+        "Описание": ["Перевод на карту", "РЖД"],
+        "Сумма операции": [-55.0, -1212.8],
+    }
+
+
+@pytest.mark.parametrize(
+    "filters, start_date, expected",
+    [
+        ({"Категория": "Фастфуд", "card": "4556"}, None, {"start": 0, "end": 3, "driver": "Категория"}),
+        ({"card": "4556", "Статус": "OK"}, None, {"start": 0, "end": 3, "driver": "card"}),
+        ({"card": "7197"}, datetime(2021, 12, 1), {"start": 2, "end": 3, "driver": None}),
+        ({"Статус": "OK"}, None, {"start": 0, "end": 3, "driver": None}),
+    ],
+)
+def test_plan_query(get_df, filters, start_date, expected):
+    """Тестирует выбор ведущего фильтра по индексу и границ по датам."""
+    df = sort_by_date(apply_schema(get_df))
+    filters = {column: [value] for column, value in filters.items()}
+    plan = plan_query(df, filters, start_date, index=build_operations_index(df))
+    assert {key: plan[key] for key in expected} == expected
+    assert plan["scanned"] == [column for column in filters if column != expected["driver"]]
+
+
+def test_aggregate_operations(get_df):
+    """Тестирует агрегацию сумм по номеру карты без операций с пропущенным значением."""
+    df = apply_schema(get_df)
+    assert aggregate_operations(df, "card", aggregates=["sum", "count"]).to_dict(orient="index") == {
+        "4556": {"sum": -1267.8, "count": 2},
+        "7197": {"sum": -99.0, "count": 1},
+    }
+    assert aggregate_operations(df, "Категория", "Кэшбэк").to_dict(orient="index") == {
+        "Ж/д билеты": {"sum": 12.0},
+        "Фастфуд": {"sum": 0.0},
+    }
+
+
+@pytest.mark.parametrize("prepare_df", [lambda df: df, sort_by_date])
+def test_build_totals_index(get_df, prepare_df):
+    """Тестирует накопленные суммы по всем операциям и по каждой карте в порядке дат."""
+    totals = build_totals_index(prepare_df(apply_schema(get_df)), {"ones": np.ones(3)})
+    assert totals["rows"] == 3
+    assert list(totals["groups"]) == ["card", "Категория"]
+    assert totals["all"]["dates"].tolist() == sorted(totals["all"]["dates"].tolist())
+    assert totals["all"]["sums"]["Сумма платежа"].tolist() == [0.0, -1212.8, -1267.8, -1366.8]
+    assert totals["groups"]["card"]["4556"]["sums"]["Кэшбэк"].tolist() == [0.0, 12.0, 12.0]
+    assert totals["groups"]["card"]["7197"]["sums"]["ones"].tolist() == [0.0, 1.0]
+
+
+@pytest.mark.parametrize(
+    "start_date, end_date, expected",
+    [
+        (None, None, {"Сумма платежа": -1366.8, "Кэшбэк": 12.0, "count": 3}),
+        (datetime(2021, 11, 1), datetime(2021, 11, 30, 23), {"Сумма платежа": -55.0, "Кэшбэк": 0.0, "count": 1}),
+        (datetime(2021, 11, 30, 18, 19, 28), None, {"Сумма платежа": -154.0, "Кэшбэк": 0.0, "count": 2}),
+        (None, datetime(2018, 1, 31, 20, 9, 33), {"Сумма платежа": -1212.8, "Кэшбэк": 12.0, "count": 1}),
+        (datetime(2021, 12, 31), datetime(2021, 1, 1), {"Сумма платежа": 0.0, "Кэшбэк": 0.0, "count": 0}),
+    ],
+)
+def test_get_window_total(get_df, start_date, end_date, expected):
+    """Тестирует подсчет сумм за произвольный период по накопленным суммам."""
+    totals = build_totals_index(apply_schema(get_df))
+    assert get_window_total(totals["all"], start_date, end_date) == pytest.approx(expected)
+
+
+def test_get_window_totals(get_df):
+    """Тестирует подсчет сумм за период по каждой карте без карт, по которым не было операций."""
+    df = get_df.assign(**{"Дата операции": ["01.12.2021 12:35:05", np.nan, "31.01.2018 20:09:33"]})
+    totals = build_totals_index(apply_schema(df))
+    assert get_window_totals(totals, "card", datetime(2018, 1, 1), datetime(2018, 12, 31)) == {
+        "4556": {"Сумма платежа": -1212.8, "Кэшбэк": 12.0, "count": 1}
+    }
+    assert list(get_window_totals(totals, "card")) == ["4556", "7197"]
+
+
+@pytest.mark.parametrize(
+    "current_date", ["01.12.2021 23:00:00", "30.11.2021 18:19:28", "31.01.2018 23:00:00", "01.10.2021 00:00:00"]
+)
+def test_get_cards_summary_by_totals(get_df, current_date):
+    """Тестирует совпадение информации по картам по накопленным суммам и по операциям месяца."""
+    df = sort_by_date(apply_schema(get_df))
+    end_date = datetime.strptime(current_date, "%d.%m.%Y %H:%M:%S")
+    assert get_cards_summary_by_totals(
+        build_totals_index(df), end_date.replace(day=1, hour=0, minute=0, second=0), end_date
+    ) == get_cards_summary(filter_by_date(current_date, df))
+
+
+@pytest.mark.parametrize("split", [slice(0, 1), slice(1, 3)])
+def test_append_operations(get_df, split):
+    """Тестирует добавление операций с обновлением индекса (в конец или с пересортировкой)."""
+    df = sort_by_date(apply_schema(get_df))
+    new_rows = df.iloc[split].reset_index(drop=True)
+    loaded = df.drop(index=df.index[split]).reset_index(drop=True)
+    loaded.attrs["sorted_by_date"] = True
+
+    result, index = append_operations(loaded, new_rows, build_operations_index(loaded))
+    assert result["Описание"].tolist() == df["Описание"].tolist()
+    assert result.attrs["sorted_by_date"]
+    expected_index = build_operations_index(result)
+    assert index["rows"] == expected_index["rows"]
+    for column, values in expected_index["columns"].items():
+        assert index["columns"][column].keys() == values.keys()
+        assert all(list(index["columns"][column][value]) == list(positions) for value, positions in values.items())
+
+
+def test_get_data_from_xlsx_cache(get_df, tmp_path, caplog):
+    """Тестирует повторное чтение данных из кэша."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+
+    df = get_data_from_xlsx(file_path)
+    assert f"Cache miss for {file_path}" in caplog.messages
+    assert all(os.path.exists(path) for path in get_cache_paths(file_path))
+
+    with patch("src.utils.pd.read_excel") as mock_read_excel:
+        assert get_data_from_xlsx(file_path).equals(df)
+        mock_read_excel.assert_not_called()
+    assert f"Cache hit for {file_path}" in caplog.messages
+
+
+def test_get_data_from_xlsx_cache_touched_file(get_df, tmp_path):
+    """Тестирует работу кэша, когда время изменения файла поменялось, а содержимое - нет."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+    df = get_data_from_xlsx(file_path)
+    os.utime(file_path, ns=(0, 0))
+
+    with patch("src.utils.pd.read_excel") as mock_read_excel:
+        assert get_data_from_xlsx(file_path).equals(df)
+        mock_read_excel.assert_not_called()
+
+
+def test_get_data_from_xlsx_cache_changed_file(get_df, dec_df, tmp_path, caplog):
+    """Тестирует перестроение кэша при изменении исходного файла."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+    get_data_from_xlsx(file_path)
+    dec_df.to_excel(file_path, index=False)
+
+    assert len(get_data_from_xlsx(file_path)) == len(dec_df)
+    assert caplog.messages.count(f"Cache miss for {file_path}") == 2
+
+
+def test_get_data_from_xlsx_incremental(get_df, tmp_path, caplog):
+    """Тестирует дозагрузку строк, добавленных в конец excel-файла."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.iloc[:2].to_excel(file_path, index=False)
+    assert len(get_data_from_xlsx(file_path, incremental=True)) == 2
+    assert "Ingested 2 new rows" in caplog.messages
+
+    get_df.to_excel(file_path, index=False)
+    df = get_data_from_xlsx(file_path, incremental=True)
+
+    assert "Ingested 1 new rows" in caplog.messages
+    assert df["Описание"].tolist() == ["РЖД", "Перевод на карту", "IP Yakubovskaya M.V."]
+    assert df["Сумма операции"].tolist() == [-1212.80, -55.00, -99.00]
+    assert get_data_from_xlsx(file_path, incremental=True).equals(df)
+    assert f"Cache hit for {file_path}" in caplog.messages
+
+
+@pytest.mark.parametrize("changed_df", [lambda df: df.iloc[::-1], lambda df: df.iloc[:1]])
+def test_get_data_from_xlsx_incremental_changed_prefix(get_df, tmp_path, caplog, changed_df):
+    """Тестирует полную перезагрузку данных, когда ранее загруженные строки изменились."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.iloc[:2].to_excel(file_path, index=False)
+    get_data_from_xlsx(file_path, incremental=True)
+
+    changed_df(get_df).to_excel(file_path, index=False)
+    df = get_data_from_xlsx(file_path, incremental=True)
+
+    assert f"Already ingested rows of {file_path} changed. Reloading the whole file" in caplog.messages
+    assert df["Описание"].tolist() == sort_by_date(changed_df(get_df))["Описание"].tolist()
+
+
+@patch("src.utils.read_appended_rows", return_value=None)
+def test_get_data_from_xlsx_incremental_unreadable(mock_read, get_df, tmp_path, get_empty_df, caplog):
+    """Тестирует, что при невозможности прочитать строки файла возвращается пустой датафрейм."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+    assert get_data_from_xlsx(file_path, incremental=True).equals(get_empty_df)
+    assert f"Failed to read rows of {file_path}" in caplog.messages
+
+
+@pytest.mark.parametrize("pattern", ["", "*.xlsx", "2021-*.xlsx"])
+def test_get_data_from_xlsx_many_files(get_df, tmp_path, pattern):
+    """Тестирует считывание данных из всех excel-файлов папки или glob-шаблона."""
+    get_df.iloc[:1].to_excel(tmp_path / "2021-11.xlsx", index=False)
+    get_df.iloc[1:].to_excel(tmp_path / "2021-12.xlsx", index=False)
+    (tmp_path / "notes.txt").write_text("not a statement")
+
+    df = get_data_from_xlsx(os.path.join(str(tmp_path), pattern))
+
+    assert df["source"].tolist() == ["2021-12.xlsx", "2021-12.xlsx", "2021-11.xlsx"]
+    assert df["Описание"].tolist() == ["РЖД", "Перевод на карту", "IP Yakubovskaya M.V."]
+
+
+def test_get_data_from_xlsx_many_files_keeps_log(get_df, tmp_path):
+    """Тестирует, что процессы пула не очищают лог родителя при запуске процессов через spawn по умолчанию."""
+    get_df.iloc[:1].to_excel(tmp_path / "2021-11.xlsx", index=False)
+    get_df.iloc[1:].to_excel(tmp_path / "2021-12.xlsx", index=False)
+    utils.logger.info("Marker before reading many files")
+    start_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        assert len(get_data_from_xlsx(str(tmp_path), use_cache=False)) == 3
+    finally:
+        multiprocessing.set_start_method(start_method, force=True)
+    utils.file_handler.flush()
+    with open(utils.log_file_path, encoding="utf-8") as log_file:
+        assert "Marker before reading many files" in log_file.read()
+
+
+def test_get_data_from_xlsx_many_files_cache(get_df, tmp_path):
+    """Тестирует использование кэша каждого файла при считывании данных из папки."""
+    get_df.iloc[:1].to_excel(tmp_path / "2021-11.xlsx", index=False)
+    get_df.iloc[1:].to_excel(tmp_path / "2021-12.xlsx", index=False)
+    df = get_data_from_xlsx(str(tmp_path))
+
+    with patch("src.utils.pd.read_excel") as mock_read_excel:
+        assert get_data_from_xlsx(str(tmp_path)).equals(df)
+        mock_read_excel.assert_not_called()
+
+
+def test_get_data_from_xlsx_many_files_not_found(tmp_path, get_empty_df, capsys):
+    """Тестирует работу функции, когда в папке нет excel-файлов."""
+    assert get_data_from_xlsx(str(tmp_path)).equals(get_empty_df)
+    captured = capsys.readouterr()
+    assert captured.out == "Файл не найден. Проверьте правильность введенных данных.\n"
+
+
 def test_get_data_from_xlsx_no_such_file(get_empty_df, capsys):
     """Тестирует работу функции, когда Excel-файл не найден."""
     file_name = "no_such_file.xlsx"
@@ -28,12 +490,63 @@ def test_get_data_from_xlsx_no_such_file(get_empty_df, capsys):
     assert get_data_from_xlsx(file_name).equals(get_empty_df)
 
 
+def test_read_xlsx_by_chunks(get_df, tmp_path):
+    """Тестирует потоковое чтение excel-файла частями."""
+    file_path = str(tmp_path / "operations.xlsx")
+    get_df.to_excel(file_path, index=False)
+
+    chunks = list(read_xlsx_by_chunks(file_path, chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0].columns)[: len(get_df.columns)] == list(get_df.columns)
+    assert chunks[1]["MCC"].dtype == chunks[0]["MCC"].dtype == "Int64"
+    assert chunks[1]["Кэшбэк"].dtype == chunks[0]["Кэшбэк"].dtype == "float64"
+    assert pd.concat(chunks)["Описание"].tolist() == get_df["Описание"].tolist()
+    df = get_data_from_xlsx(file_path, use_cache=False)
+    assert concat_operations(chunks).dtypes.to_dict() == df.dtypes.to_dict()
+
+
+def test_filter_chunks_by_date(get_df, dec_df):
+    """Тестирует фильтрацию операций при потоковом чтении данных."""
+    chunks = [get_df.iloc[:2].copy(), get_df.iloc[2:].copy()]
+    assert filter_chunks_by_date("02.12.2021 00:00:00", chunks).iloc[:, :-1].equals(dec_df)
+
+
+def test_filter_chunks_by_date_wrong_date(get_df, get_empty_df, capsys):
+    """Тестирует фильтрацию операций при потоковом чтении данных и неверном формате даты."""
+    assert filter_chunks_by_date("31.12.2021", [get_df.iloc[:2], get_df.iloc[2:]]).equals(get_empty_df)
+    captured = capsys.readouterr()
+    assert captured.out == "Неправильный формат даты. Введите дату в формате DD.MM.YY HH:MM:SS\n"
+
+
 def test_filter_by_date(get_df, dec_df):
     """Тестирует нормальную работу функции."""
     current_month_df = filter_by_date("02.12.2021 00:00:00", get_df).iloc[:, :-1]
     assert current_month_df.equals(dec_df)
 
 
+def test_filter_by_date_keeps_source_df(get_df):
+    """Тестирует, что функция не изменяет исходный датафрейм."""
+    columns = list(get_df.columns)
+    filter_by_date("02.12.2021 00:00:00", get_df)
+    assert list(get_df.columns) == columns
+
+
+def test_filter_by_date_malformed_rows(get_df, dec_df, caplog):
+    """Тестирует работу функции, когда в датафрейме есть операции с некорректной датой."""
+    get_df.loc[1, "Дата операции"] = "30.11.2021"
+    assert filter_by_date("02.12.2021 00:00:00", get_df).iloc[:, :-1].equals(dec_df)
+    assert "Found 1 malformed dates in column Дата операции. First of them: {1: '30.11.2021'}" in caplog.messages
+
+
+def test_parse_dates():
+    """Тестирует векторное преобразование дат и сообщение о некорректных значениях."""
+    dates = pd.Series(["01.12.2021", np.nan, "2021-12-01", "31.02.2021"], name="Дата платежа")
+    parsed_dates = parse_dates(dates, "%d.%m.%Y")
+    assert parsed_dates.tolist()[0] == datetime(2021, 12, 1)
+    assert parsed_dates.isna().tolist() == [False, True, True, True]
+
+
 @pytest.mark.parametrize(
     "date",
     [
@@ -82,6 +595,12 @@ def test_get_total_expenses_empty_df(get_empty_df):
     assert get_total_expenses(get_empty_df) == {"nan": 0.0}
 
 
+def test_get_total_expenses_by_chunks(get_df):
+    """Тестирует подсчет расходов по картам при потоковом чтении данных."""
+    chunks = [get_df.iloc[:2], get_df.iloc[2:]]
+    assert get_total_expenses_by_chunks(chunks) == {"4556": 1267.80, "7197": 99.00}
+
+
 def test_calculate_cashback(monthly_operations, cashback):
     """Тестирует нормальную работу функции."""
     assert calculate_cashback(monthly_operations) == cashback
@@ -141,6 +660,44 @@ def test_process_cards_info_empty_data():
     assert process_cards_info({"nan": [0.0, 0.0]}) == []
 
 
+def test_get_cards_summary(get_df):
+    """Тестирует нормальную работу функции."""
+    assert get_cards_summary(get_df) == [
+        {"last_digits": "4556", "total_spent": 1267.80, "cashback": 12.68},
+        {"last_digits": "7197", "total_spent": 99.00, "cashback": 0.99},
+    ]
+
+
+def test_get_cards_summary_aggregates(get_df, caplog):
+    """Тестирует вывод дополнительных агрегатов по картам."""
+    assert get_cards_summary(apply_schema(get_df), ["mean", "count", "max", "min", "median"]) == [
+        {
+            "last_digits": "4556",
+            "total_spent": 1267.80,
+            "cashback": 12.68,
+            "count": 2,
+            "min": -1212.80,
+            "max": -55.00,
+            "mean": -633.90,
+        },
+        {
+            "last_digits": "7197",
+            "total_spent": 99.00,
+            "cashback": 0.99,
+            "count": 1,
+            "min": -99.00,
+            "max": -99.00,
+            "mean": -99.00,
+        },
+    ]
+    assert "Unknown aggregate median is skipped" in caplog.messages
+
+
+def test_get_cards_summary_empty_df(get_empty_df):
+    """Тестирует работу функции при отсутствии данных."""
+    assert get_cards_summary(get_empty_df) == []
+
+
 def test_get_top_five_transactions(get_df):
     transactions_list = sort_by_amount(get_df)
     assert get_top_five_transactions(transactions_list)[:2] == [
@@ -159,6 +716,30 @@ def test_get_top_five_transactions(get_df):
     ]
 
 
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 5])
+def test_get_top_transactions(get_df, n):
+    """Тестирует вывод топ-n транзакций (пропуски возвращаются как None)."""
+    assert get_top_transactions(get_df, n) == [
+        {key: None if pd.isna(value) else value for key, value in transaction.items()}
+        for transaction in get_top_five_transactions(sort_by_amount(get_df))[:n]
+    ]
+
+
+def test_get_top_transactions_typed_df(get_df):
+    """Тестирует вывод топ-n транзакций для датафрейма, приведенного к типам схемы."""
+    assert get_top_transactions(apply_schema(get_df), 2) == [
+        {"date": "31.01.2018", "amount": -1212.80, "category": "Ж/д билеты", "description": "РЖД"},
+        {"date": "01.12.2021", "amount": -99.00, "category": "Фастфуд", "description": "IP Yakubovskaya M.V."},
+    ]
+
+
+def test_get_top_transactions_by_chunks(get_df):
+    """Тестирует объединение топ-n транзакций, выбранных из разных частей данных."""
+    chunks = [get_df.iloc[:1], get_df.iloc[1:]]
+    assert get_top_transactions_by_chunks(chunks, 2) == get_top_transactions(get_df, 2)
+    assert get_top_transactions_by_chunks(chunks) == get_top_transactions(get_df)
+
+
 @patch("src.utils.json.load")
 @patch("src.utils.open")
 def test_get_currencies(mock_open, mock_json_load, currencies):
@@ -281,16 +862,30 @@ def test_get_data_from_user_wrong_data(mock_get_currencies, mock_get_stocks, inp
     assert get_data_from_user(input_currencies, input_stocks) == "Проверьте правильность введенных данных."
 
 
-@patch("src.utils.requests.get")
+@pytest.mark.parametrize(
+    "content, expected",
+    [('{"rates": {"USD": 87.99}}', {"rates": {"USD": 87.99}}), ("[1, 2]", {}), ("{", {}), (None, {})],
+)
+def test_read_json_cache(cache_dir, content, expected):
+    """Тестирует чтение JSON-кэша (отсутствующий, поврежденный или не словарь - пустой словарь)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    if content is not None:
+        with open(os.path.join(cache_dir, "cache.json"), "w", encoding="utf-8") as cache_file:
+            cache_file.write(content)
+    assert read_json_cache("cache.json") == expected
+
+
+@patch("src.http_client.session.get")
 def test_get_data_via_api_currencies(mock_get, api_response_currencies):
     """Тестирует нормальную работу функции."""
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = api_response_currencies
+    mock_get.return_value.headers = {}
     result = get_data_via_api_currencies(["USD", "EUR", "CNY", "JPY", "KZT"])
     assert result == (True, [87.99, 95.18, 11.89, 59.64, 18.44])
 
 
-@patch("src.utils.requests.get")
+@patch("src.http_client.session.get")
 def test_get_data_via_api_currencies_denied_request(mock_get):
     """Тестирует работу функции, когда запрос был заблокирован."""
     mock_get.return_value.status_code = 403
@@ -301,12 +896,42 @@ def test_get_data_via_api_currencies_denied_request(mock_get):
 
 def test_get_data_via_api_currencies_request_error():
     """Тестирует работу функции при возникновении ошибки."""
-    with mock.patch("requests.get", side_effect=requests.exceptions.RequestException("Something went wrong")):
+    error = requests.exceptions.RequestException("Something went wrong")
+    with mock.patch("src.http_client.session.get", side_effect=error):
         result = get_data_via_api_currencies(["USD", "EUR", "CNY", "JPY", "KZT"])
     assert result == (False, "Something went wrong")
 
 
-@patch("src.utils.requests.get")
+def test_get_data_via_api_currencies_cache(currencies_server):
+    """Тестирует повторное использование закэшированных курсов валют."""
+    for _ in range(3):
+        result = get_data_via_api_currencies(["USD", "EUR", "CNY", "JPY", "KZT"])
+        assert result == (True, [87.99, 95.18, 11.89, 59.64, 18.44])
+    assert currencies_server.requests == [{"If-None-Match": None, "If-Modified-Since": None}]
+
+
+def test_get_data_via_api_currencies_not_modified(currencies_server, caplog):
+    """Тестирует условный запрос курсов валют после истечения срока кэша."""
+    get_data_via_api_currencies(["USD"])
+    result = get_data_via_api_currencies(["USD", "KZT"], ttl=0)
+    assert result == (True, [87.99, 18.44])
+    assert currencies_server.requests[-1] == {
+        "If-None-Match": '"rates-2024-08-10"',
+        "If-Modified-Since": "Sat, 10 Aug 2024 08:30:00 GMT",
+    }
+    assert "Currencies rates not modified. Using cached rates." in caplog.text
+
+
+def test_get_data_via_api_currencies_stale_cache_on_error(currencies_server):
+    """Тестирует, что ошибка сервера не портит кэш курсов валют."""
+    get_data_via_api_currencies(["USD"])
+    currencies_server.status = 503
+    assert get_data_via_api_currencies(["USD"], ttl=0) == (False, "Service Unavailable")
+    currencies_server.status = 200
+    assert get_data_via_api_currencies(["USD"]) == (True, [87.99])
+
+
+@patch("src.http_client.session.get")
 def test_get_data_via_api_stocks(mock_get, api_response_stocks):
     """Тестирует нормальную работу функции."""
     mock_get.return_value.status_code = 200
@@ -315,7 +940,7 @@ def test_get_data_via_api_stocks(mock_get, api_response_stocks):
     assert result == (True, [216.24, 166.94, 163.67, 406.02, 200])
 
 
-@patch("src.utils.requests.get")
+@patch("src.http_client.session.get")
 def test_get_data_via_api_stocks_denied_access(mock_get):
     """Тестирует работу функции, когда доступ был запрещен."""
     mock_get.return_value.status_code = 401
@@ -326,11 +951,46 @@ def test_get_data_via_api_stocks_denied_access(mock_get):
 
 def test_get_data_via_api_stocks_request_error():
     """Тестирует работу функции при возникновении ошибки."""
-    with mock.patch("requests.get", side_effect=requests.exceptions.RequestException("Something went wrong")):
+    error = requests.exceptions.RequestException("Something went wrong")
+    with mock.patch("src.http_client.session.get", side_effect=error):
         result = get_data_via_api_stocks(["AAPL", "AMZN", "GOOGL", "MSFT", "TSLA"])
     assert result == (False, "Something went wrong")
 
 
+@patch("src.http_client.session.get")
+def test_get_data_via_api_stocks_ticker_order(mock_get, api_response_stocks):
+    """Тестирует, что цены возвращаются в порядке тикеров пользователя."""
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = api_response_stocks
+    result = get_data_via_api_stocks(["TSLA", "XXXX", "AAPL"])
+    assert result == (True, [200, None, 216.24])
+
+
+@patch("src.http_client.session.get")
+def test_get_data_via_api_stocks_cache(mock_get, api_response_stocks, monkeypatch):
+    """Тестирует повторное использование индекса цен акций из памяти и с диска."""
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = api_response_stocks
+    get_data_via_api_stocks(["AAPL"])
+    assert get_data_via_api_stocks(["MSFT"]) == (True, [406.02])
+    monkeypatch.setattr("src.utils.stocks_index", StocksIndex())
+    assert get_data_via_api_stocks(["AMZN"]) == (True, [166.94])
+    assert mock_get.call_count == 1
+
+
+@patch("src.http_client.session.get")
+def test_get_data_via_api_stocks_background_refresh(mock_get, api_response_stocks):
+    """Тестирует, что устаревший индекс отдается сразу и обновляется в фоне."""
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = api_response_stocks
+    get_data_via_api_stocks(["AAPL"])
+    mock_get.return_value.json.return_value = [{"symbol": "AAPL", "price": 220.5}]
+    assert get_data_via_api_stocks(["AAPL"], ttl=0) == (True, [216.24])
+    utils.stocks_index.refresh.join()
+    assert get_data_via_api_stocks(["AAPL"]) == (True, [220.5])
+    assert mock_get.call_count == 2
+
+
 @patch("src.utils.get_data_via_api_currencies")
 def test_get_exchange_rates(mock_get_currencies):
     """Тестирует нормальную работу функции."""
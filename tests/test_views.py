@@ -1,21 +1,28 @@
+import json
+import time
 from unittest.mock import patch
 
-from src.views import generate_json_response
+import pandas as pd
+import pytest
+
+from src import views
+from src.utils import apply_schema, build_totals_index, filter_by_date, get_cards_summary, sort_by_date
+from src.views import generate_json_response, get_local_sections, read_user_settings
 
 
 @patch("os.path.dirname", return_value="/mock/path")
 @patch("os.path.join", side_effect=lambda *args: "/".join(args))
 @patch("src.views.get_stock_prices")
 @patch("src.views.get_exchange_rates")
-@patch("src.views.get_top_five_transactions")
-@patch("src.views.process_cards_info")
+@patch("src.views.get_top_transactions")
+@patch("src.views.get_cards_summary")
 @patch("src.views.json.load")
 @patch("src.views.open")
 def test_generate_json_response(
     mock_open,
     mock_json,
-    mock_process_cards_info,
-    mock_get_top_five_transactions,
+    mock_get_cards_summary,
+    mock_get_top_transactions,
     mock_get_get_exchange_rates,
     mock_get_stock_prices,
     mock_join,
@@ -25,7 +32,7 @@ def test_generate_json_response(
 ):
     """Тестирует нормальную работу функции."""
     mock_json.return_value = {"user_currencies": ["USD", "EUR"], "user_stocks": ["AAPL", "AMZN"]}
-    mock_process_cards_info.return_value = [
+    mock_get_cards_summary.return_value = [
         {
             "last_digits": "1112",
             "total_spent": 46207.08,
@@ -42,7 +49,7 @@ def test_generate_json_response(
             "cashback": 149.18,
         },
     ]
-    mock_get_top_five_transactions.return_value = [
+    mock_get_top_transactions.return_value = [
         {
             "date": "31.01.2018",
             "amount": -1212.80,
@@ -73,3 +80,149 @@ def test_generate_json_response_wrong_date(get_df, capsys):
     assert generate_json_response("31.12.2021 16:44:00", get_df) is None
     captured = capsys.readouterr()
     assert captured.out == "Неправильный формат даты. Введите дату в формате YYYY-MM-DD HH:MM:SS\n"
+
+
+@patch("src.views.get_stock_prices", side_effect=lambda stocks: time.sleep(0.3) or [])
+@patch("src.views.get_exchange_rates", side_effect=lambda currencies: time.sleep(0.3) or [])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_concurrent_fetches(mock_open, mock_json, mock_rates, mock_prices, get_df):
+    """Тестирует, что курсы валют и цены акций запрашиваются одновременно."""
+    started_at = time.monotonic()
+    result = json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+    assert time.monotonic() - started_at < 0.55
+    assert result["currency_rates"] == [] and result["stock_prices"] == []
+
+
+@patch("src.views.get_stock_prices", return_value=[])
+@patch("src.views.get_exchange_rates", return_value=[])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_missing_category(mock_open, mock_json, mock_rates, mock_prices, get_df):
+    """Тестирует, что пропущенная категория в топ-5 транзакций возвращается как null, а не NaN."""
+
+    def reject_constant(constant):
+        raise ValueError(f"Invalid JSON constant {constant}")
+
+    result = json.loads(generate_json_response("2021-11-30 23:59:59", get_df), parse_constant=reject_constant)
+    assert result["top_transactions"] == [
+        {"date": "30.11.2021", "amount": -55.0, "category": None, "description": "Перевод на карту"}
+    ]
+
+
+@patch("src.views.STOCKS_DEADLINE", 0.1)
+@patch("src.views.get_stock_prices", side_effect=lambda stocks: time.sleep(0.5))
+@patch("src.views.get_exchange_rates", return_value=[{"currency": "USD", "rate": 87.99}])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_deadline(mock_open, mock_json, mock_rates, mock_prices, get_df, caplog):
+    """Тестирует, что раздел, не уложившийся в свой срок, не задерживает страницу."""
+    started_at = time.monotonic()
+    result = json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+    assert time.monotonic() - started_at < 0.4
+    assert result["currency_rates"] == [{"currency": "USD", "rate": 87.99}]
+    assert "stock_prices" not in result
+    assert result["status"] == {"currency_rates": "ok", "stock_prices": "unavailable"}
+    assert "Section stock_prices missed its deadline of 0.1 s." in caplog.text
+
+
+@patch("src.views.STOCKS_DEADLINE", 0.05)
+@patch("src.views.get_stock_prices", side_effect=lambda stocks: time.sleep(0.3) or [])
+@patch("src.views.get_exchange_rates", return_value=[])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_reuses_fetch(mock_open, mock_json, mock_rates, mock_prices, get_df):
+    """Тестирует, что зависший запрос раздела не запускается повторно, пока он выполняется."""
+    for _ in range(3):
+        result = json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+        assert result["status"]["stock_prices"] == "unavailable"
+    assert mock_prices.call_count == 1
+    assert len(views.market_fetches) == 1
+
+    views.market_fetches[("stock_prices", ("AAPL",))].result()
+    for _ in range(100):
+        if not views.market_fetches:
+            break
+        time.sleep(0.01)
+    assert not views.market_fetches
+    json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+    assert mock_prices.call_count == 2
+
+
+@patch("src.views.STOCKS_TTL", 0)
+@patch("src.views.PAGE_BUDGET", 0.1)
+@patch("src.views.get_stock_prices")
+@patch("src.views.get_exchange_rates", return_value=None)
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_stale_sections(mock_open, mock_json, mock_rates, mock_prices, get_df):
+    """Тестирует выдачу последних удачных значений, когда разделы не готовы в пределах бюджета страницы."""
+    mock_prices.return_value = [{"stock": "AAPL", "price": 216.24}]
+    first = json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+    assert first["status"] == {"currency_rates": "unavailable", "stock_prices": "ok"}
+
+    mock_prices.side_effect = lambda stocks: time.sleep(0.5)
+    started_at = time.monotonic()
+    second = json.loads(generate_json_response("2021-12-01 15:45:00", get_df))
+    assert time.monotonic() - started_at < 0.4
+    assert second["stock_prices"] == [{"stock": "AAPL", "price": 216.24}]
+    assert second["status"] == {"currency_rates": "unavailable", "stock_prices": "stale"}
+    assert second["greeting"] == first["greeting"] and second["cards"] == first["cards"]
+
+
+@patch("src.views.get_stock_prices", return_value=[{"stock": "AAPL", "price": 216.24}])
+@patch("src.views.get_exchange_rates", return_value=[{"currency": "USD", "rate": 87.99}])
+@patch("src.views.get_cards_summary", return_value=[])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_cache(mock_open, mock_json, mock_cards, mock_rates, mock_prices, get_df):
+    """Тестирует повторное использование страницы в пределах часа и пересчет при изменении данных."""
+    first = generate_json_response("2021-12-01 15:45:00", get_df)
+    assert generate_json_response("2021-12-01 15:59:59", get_df) == first
+    assert mock_cards.call_count == mock_rates.call_count == mock_prices.call_count == 1
+
+    generate_json_response("2021-12-01 16:00:00", get_df)
+    assert mock_cards.call_count == 2
+    changed_df = get_df.assign(**{"Сумма платежа": get_df["Сумма платежа"] * 2})
+    generate_json_response("2021-12-01 16:00:00", changed_df)
+    assert mock_cards.call_count == 3
+    assert mock_rates.call_count == mock_prices.call_count == 1
+
+
+@patch("src.views.PAGE_CACHE_SIZE", 2)
+@patch("src.views.get_stock_prices", return_value=[])
+@patch("src.views.get_exchange_rates", return_value=[])
+@patch("src.views.get_cards_summary", return_value=[])
+@patch("src.views.json.load", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.open")
+def test_generate_json_response_cache_eviction(mock_open, mock_json, mock_cards, mock_rates, mock_prices, get_df):
+    """Тестирует вытеснение давно не использованных страниц из кэша."""
+    for date in ["2021-12-01 10:00:00", "2021-12-01 11:00:00", "2021-12-01 10:00:00", "2021-12-01 12:00:00"]:
+        generate_json_response(date, get_df)
+    assert mock_cards.call_count == 3
+    generate_json_response("2021-12-01 10:00:00", get_df)
+    assert mock_cards.call_count == 3
+    generate_json_response("2021-12-01 11:00:00", get_df)
+    assert mock_cards.call_count == 4
+
+
+@pytest.mark.parametrize(
+    "date", ["01.12.2021 15:45:00", "30.11.2021 23:59:59", "31.01.2018 23:00:00", "31.03.2020 12:00:00"]
+)
+def test_get_local_sections_totals(get_df, date):
+    """Тестирует, что данные по картам из накопленных сумм совпадают с расчетом по операциям за тот же период."""
+    df = sort_by_date(apply_schema(pd.concat([get_df, get_df], ignore_index=True)))
+    sections = get_local_sections(df, date, 15, build_totals_index(df))
+    assert sections["cards"] == get_cards_summary(filter_by_date(date, df))
+
+
+def test_read_user_settings(tmp_path):
+    """Тестирует повторное чтение настроек только после изменения файла."""
+    settings_path = tmp_path / "user_settings.json"
+    settings_path.write_text(json.dumps({"user_currencies": ["USD"]}))
+    with patch("src.views.open", side_effect=open) as mock_open:
+        assert read_user_settings(str(settings_path)) == {"user_currencies": ["USD"]}
+        assert read_user_settings(str(settings_path)) == {"user_currencies": ["USD"]}
+        assert mock_open.call_count == 1
+        settings_path.write_text(json.dumps({"user_currencies": ["USD", "EUR"]}))
+        assert read_user_settings(str(settings_path)) == {"user_currencies": ["USD", "EUR"]}